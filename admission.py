@@ -0,0 +1,157 @@
+# admission.py
+
+import os
+import math
+import time
+import logging
+import threading
+from collections import deque, OrderedDict
+from contextlib import contextmanager
+
+from helpers import lazy_singleton
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_MAX_CONCURRENT = int(os.environ.get("ADMISSION_MAX_CONCURRENT", 8))
+ADMISSION_MAX_PER_USER = int(os.environ.get("ADMISSION_MAX_PER_USER", 2))
+ADMISSION_MAX_QUEUE = int(os.environ.get("ADMISSION_MAX_QUEUE", 32))
+ADMISSION_MAX_WAIT_SECONDS = float(os.environ.get("ADMISSION_MAX_WAIT_SECONDS", 30))
+
+# Number of recent wait times kept for the percentile metrics.
+WAIT_TIME_SAMPLES = 500
+
+
+class AdmissionRejected(Exception):
+	"""Raised when a request is shed because the queue is full or the wait took too long."""
+
+	def __init__(self, message: str, retry_after: int):
+		super().__init__(message)
+		self.retry_after = retry_after
+
+
+class _Waiter:
+	def __init__(self, user: str):
+		self.user = user
+		self.granted = False
+		self.event = threading.Event()
+
+
+class AdmissionController:
+	"""
+	Limits how many requests run at once, globally and per user. Requests over
+	the limits wait in a bounded queue that is served round-robin per user, so
+	one user with many requests cannot starve the others.
+	"""
+
+	def __init__(self, max_concurrent: int = ADMISSION_MAX_CONCURRENT, max_per_user: int = ADMISSION_MAX_PER_USER,
+	             max_queue: int = ADMISSION_MAX_QUEUE, max_wait_seconds: float = ADMISSION_MAX_WAIT_SECONDS):
+		self.max_concurrent = max_concurrent
+		self.max_per_user = max_per_user
+		self.max_queue = max_queue
+		self.max_wait_seconds = max_wait_seconds
+		self._lock = threading.Lock()
+		self._running = {}
+		# Waiters per user; the order of the users is the round-robin order.
+		self._queues = OrderedDict()
+		self._queued = 0
+		self._wait_times = deque(maxlen=WAIT_TIME_SAMPLES)
+		self._average_duration = None
+		self._counters = {"admitted": 0, "rejected_queue_full": 0, "rejected_wait_timeout": 0}
+
+	def _can_run(self, user: str):
+		return (sum(self._running.values()) < self.max_concurrent
+		        and self._running.get(user, 0) < self.max_per_user)
+
+	def _grant(self, waiter: _Waiter):
+		self._running[waiter.user] = self._running.get(waiter.user, 0) + 1
+		waiter.granted = True
+		waiter.event.set()
+
+	def _dispatch(self):
+		"""Hands free slots to waiting users in round-robin order. Must hold the lock."""
+		while self._queues and sum(self._running.values()) < self.max_concurrent:
+			user = next((user for user in self._queues if self._running.get(user, 0) < self.max_per_user), None)
+			if user is None:
+				return
+			waiters = self._queues.pop(user)
+			self._grant(waiters.popleft())
+			self._queued -= 1
+			if waiters:
+				# Move the user to the back of the rotation.
+				self._queues[user] = waiters
+
+	def _retry_after(self):
+		"""Estimates in whole seconds when a slot is likely to free up."""
+		average_duration = self._average_duration or self.max_wait_seconds
+		return max(1, math.ceil(average_duration * (self._queued + 1) / self.max_concurrent))
+
+	def acquire(self, user: str):
+		"""Blocks until the user may run a request. Raises AdmissionRejected when shedding load."""
+		started = time.monotonic()
+		with self._lock:
+			if user not in self._queues and self._can_run(user):
+				self._grant(_Waiter(user))
+				self._record_admission(0.0)
+				return
+			if self._queued >= self.max_queue:
+				self._counters["rejected_queue_full"] += 1
+				logger.warning(f"--> [Admission] Queue full, rejecting request from {user}.")
+				raise AdmissionRejected("The agent is busy. Please try again shortly.", self._retry_after())
+			waiter = _Waiter(user)
+			self._queues.setdefault(user, deque()).append(waiter)
+			self._queued += 1
+
+		waiter.event.wait(self.max_wait_seconds)
+		with self._lock:
+			if not waiter.granted:
+				self._queues[user].remove(waiter)
+				if not self._queues[user]:
+					del self._queues[user]
+				self._queued -= 1
+				self._counters["rejected_wait_timeout"] += 1
+				logger.warning(f"--> [Admission] Waited too long, rejecting request from {user}.")
+				raise AdmissionRejected("The agent is busy. Please try again shortly.", self._retry_after())
+			self._record_admission(time.monotonic() - started)
+
+	def _record_admission(self, wait_seconds: float):
+		self._counters["admitted"] += 1
+		self._wait_times.append(wait_seconds)
+
+	def release(self, user: str, duration_seconds: float = None):
+		"""Frees the user's slot and admits the next waiter, if any."""
+		with self._lock:
+			self._running[user] -= 1
+			if not self._running[user]:
+				del self._running[user]
+			if duration_seconds is not None:
+				# Exponentially weighted moving average of request durations, for the retry hint.
+				self._average_duration = (duration_seconds if self._average_duration is None
+				                          else 0.8 * self._average_duration + 0.2 * duration_seconds)
+			self._dispatch()
+
+	@contextmanager
+	def admit(self, user: str):
+		"""Runs the body of the with-statement while holding one of the user's slots."""
+		self.acquire(user)
+		started = time.monotonic()
+		try:
+			yield
+		finally:
+			self.release(user, time.monotonic() - started)
+
+	def stats(self):
+		"""Returns queue depth, running requests, wait times and admission counters."""
+		with self._lock:
+			wait_times = sorted(self._wait_times)
+			return {
+				**self._counters,
+				"running": sum(self._running.values()),
+				"queue_depth": self._queued,
+				"users_waiting": len(self._queues),
+				"wait_seconds_p50": wait_times[len(wait_times) // 2] if wait_times else None,
+				"wait_seconds_p95": wait_times[int(len(wait_times) * 0.95)] if wait_times else None,
+				"wait_seconds_max": wait_times[-1] if wait_times else None,
+			}
+
+
+get_admission_controller = lazy_singleton(AdmissionController)
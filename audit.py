@@ -0,0 +1,270 @@
+# audit.py
+
+import os
+import re
+import logging
+import tempfile
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from googleapiclient.errors import HttpError
+
+from tools import _iter_gtm_items
+from helpers import JsonFileStore, ThreadLocalClients
+
+logger = logging.getLogger(__name__)
+
+AUDIT_MAX_WORKERS = int(os.environ.get("AUDIT_MAX_WORKERS", 8))
+AUDIT_CACHE_DIR = os.environ.get("AUDIT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "gtm_agent_audits"))
+
+MEASUREMENT_ID_PATTERN = re.compile(r"\b(G-[A-Z0-9]{6,}|UA-\d{4,}-\d+|AW-\d{6,})\b")
+GA4_CONFIG_TAG_TYPES = ("gaawc", "googtag")
+
+# Registry of audit rules, keyed by rule name. A rule receives a full container
+# version and returns a list of findings (dictionaries with at least a "message").
+AUDIT_RULES = {}
+
+
+def audit_rule(name: str):
+	"""Registers a function as an audit rule under the given name."""
+
+	def decorator(func):
+		AUDIT_RULES[name] = func
+		return func
+
+	return decorator
+
+
+def invalid_rules_error(rule_names: list):
+	"""Returns an error dictionary if any of the rule names is not a registered rule, else None."""
+	unknown_rules = [rule_name for rule_name in rule_names or [] if rule_name not in AUDIT_RULES]
+	if unknown_rules:
+		return {"error": f"Invalid rules: {', '.join(unknown_rules)}. "
+		                 f"Accepted rules are: {', '.join(AUDIT_RULES.keys())}"}
+	return None
+
+
+def _parameter_values(parameters):
+	"""Yields every (key, value) pair in a possibly nested list of GTM parameters."""
+	for parameter in parameters or []:
+		if 'value' in parameter:
+			yield parameter.get('key'), parameter['value']
+		yield from _parameter_values(parameter.get('list'))
+		yield from _parameter_values(parameter.get('map'))
+
+
+@audit_rule("duplicate_ga4_config")
+def _duplicate_ga4_config(version: dict):
+	"""Flags GA4 configuration / Google tags that share a measurement ID."""
+	tags_by_measurement_id = defaultdict(list)
+	for tag in version.get('tag', []):
+		if tag.get('type') not in GA4_CONFIG_TAG_TYPES:
+			continue
+		for key, value in _parameter_values(tag.get('parameter')):
+			if key in ('measurementId', 'tagId'):
+				tags_by_measurement_id[value].append({"name": tag.get('name'), "id": tag.get('tagId')})
+	return [{"message": f"{len(tags)} GA4 configuration tags use measurement ID {measurement_id}.",
+	         "measurement_id": measurement_id, "tags": tags}
+	        for measurement_id, tags in tags_by_measurement_id.items() if len(tags) > 1]
+
+
+@audit_rule("unused_triggers")
+def _unused_triggers(version: dict):
+	"""Flags triggers that no tag uses as a firing or blocking trigger and no trigger group includes."""
+	used_trigger_ids = set()
+	for tag in version.get('tag', []):
+		used_trigger_ids.update(tag.get('firingTriggerId', []))
+		used_trigger_ids.update(tag.get('blockingTriggerId', []))
+	for trigger in version.get('trigger', []):
+		if trigger.get('type') != 'triggerGroup':
+			continue
+		for parameter in trigger.get('parameter', []):
+			if parameter.get('key') == 'triggerIds':
+				used_trigger_ids.update(value for _, value in _parameter_values(parameter.get('list')))
+	return [{"message": f"Trigger '{trigger.get('name')}' is not used by any tag or trigger group.",
+	         "name": trigger.get('name'), "id": trigger.get('triggerId')}
+	        for trigger in version.get('trigger', []) if trigger.get('triggerId') not in used_trigger_ids]
+
+
+@audit_rule("paused_tags")
+def _paused_tags(version: dict):
+	"""Flags tags that are paused in the live version."""
+	return [{"message": f"Tag '{tag.get('name')}' is paused.", "name": tag.get('name'), "id": tag.get('tagId')}
+	        for tag in version.get('tag', []) if tag.get('paused')]
+
+
+@audit_rule("hardcoded_measurement_ids")
+def _hardcoded_measurement_ids(version: dict):
+	"""Flags tags with measurement IDs typed in directly instead of referenced through a variable."""
+	findings = []
+	for tag in version.get('tag', []):
+		measurement_ids = sorted({match for _, value in _parameter_values(tag.get('parameter'))
+		                          for match in MEASUREMENT_ID_PATTERN.findall(str(value))})
+		if measurement_ids:
+			findings.append({"message": f"Tag '{tag.get('name')}' hard-codes {', '.join(measurement_ids)}.",
+			                 "name": tag.get('name'), "id": tag.get('tagId'), "measurement_ids": measurement_ids})
+	return findings
+
+
+class AuditCache:
+	"""
+	Stores rule results per container version on disk. A container whose live
+	version and fingerprint are unchanged is not downloaded or audited again.
+	"""
+
+	def __init__(self, directory: str = AUDIT_CACHE_DIR):
+		self._files = JsonFileStore(directory)
+
+	def get(self, container_id: str, version_id: str, fingerprint: str, rule_name: str):
+		return self._files.load(f"{container_id}_{version_id}_{fingerprint}_{rule_name}")
+
+	def set(self, container_id: str, version_id: str, fingerprint: str, rule_name: str, findings: list):
+		self._files.save(f"{container_id}_{version_id}_{fingerprint}_{rule_name}", findings)
+
+
+def _audit_container(tag_manager_client, container: dict, rule_names: list, cache: AuditCache):
+	"""
+	Runs the rules over a container's live version, reusing cached results where
+	possible. Returns None if the container has no live version.
+	"""
+	parent_path = container.get('path') or f"accounts/{container['accountId']}/containers/{container['containerId']}"
+	method = tag_manager_client.accounts().containers().versions().live
+	try:
+		header = method(parent=parent_path, fields="containerVersionId,fingerprint").execute()
+	except HttpError as e:
+		if e.resp.status == 404:
+			# The container has never been published.
+			return None
+		raise
+	version_id, fingerprint = header.get('containerVersionId'), header.get('fingerprint')
+
+	findings = {rule_name: cache.get(container['containerId'], version_id, fingerprint, rule_name)
+	            for rule_name in rule_names}
+	missing_rules = [rule_name for rule_name, result in findings.items() if result is None]
+	if missing_rules:
+		version = method(parent=parent_path).execute()
+		for rule_name in missing_rules:
+			findings[rule_name] = AUDIT_RULES[rule_name](version)
+			cache.set(container['containerId'], version_id, fingerprint, rule_name, findings[rule_name])
+	return version_id, findings, not missing_rules
+
+
+def audit_account(credentials_dict: dict, account_id: str, rules: list = None, max_workers: int = AUDIT_MAX_WORKERS,
+                  progress=None, on_container=None):
+	"""
+	Audits the live version of every container in an account, auditing at most
+	max_workers containers concurrently.
+
+	Args:
+		credentials_dict (dict): The user's credentials; every worker thread builds its own client.
+		account_id (str): The GTM account ID.
+		rules (list): Names of the AUDIT_RULES to run. Defaults to all rules.
+		max_workers (int): The maximum number of containers audited at the same time.
+		progress (callable): Optional. Called as progress(done, total) after each container.
+		on_container (callable): Optional. Called with the report entry of each container that
+			has findings or failed, as soon as it completes.
+
+	Returns:
+		dict: An aggregated report with finding counts per rule and, for every
+			  container with findings, the findings per rule. Containers that were
+			  never published are listed under "no_live_version". Returns a
+			  dictionary with an "error" key if the containers cannot be listed.
+	"""
+	rule_names = rules or list(AUDIT_RULES.keys())
+	error = invalid_rules_error(rule_names)
+	if error:
+		return error
+
+	clients = ThreadLocalClients()
+	try:
+		method = clients.get(account_id, credentials_dict).accounts().containers().list
+		containers = list(_iter_gtm_items(method, f"accounts/{account_id}", 'container'))
+	except HttpError as e:
+		return {"error": f"Failed to retrieve containers for account {account_id}: API Error {e.resp.status}."}
+	except ConnectionError as e:
+		return {"error": f"Failed to retrieve containers for account {account_id}: {e}"}
+
+	cache = AuditCache()
+
+	def audit_one(container):
+		return _audit_container(clients.get(account_id, credentials_dict), container, rule_names, cache)
+
+	report = {
+		"account_id": account_id,
+		"rules": rule_names,
+		"containers_audited": 0,
+		"containers_from_cache": 0,
+		"findings_by_rule": {rule_name: 0 for rule_name in rule_names},
+		"containers": [],
+		"failed": [],
+		"no_live_version": [],
+	}
+	logger.info(f"--> [Audit] Auditing {len(containers)} containers in account {account_id}.")
+	executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gtm-audit")
+	try:
+		futures = {executor.submit(audit_one, container): container for container in containers}
+		for done, future in enumerate(as_completed(futures), start=1):
+			container = futures[future]
+			entry = None
+			try:
+				audited = future.result()
+			except HttpError as e:
+				entry = {"container_id": container.get('containerId'), "name": container.get('name'),
+				         "error": f"API Error: {e.resp.status}"}
+				report["failed"].append(entry)
+			except Exception as e:
+				entry = {"container_id": container.get('containerId'), "name": container.get('name'), "error": str(e)}
+				report["failed"].append(entry)
+			else:
+				if audited is None:
+					report["no_live_version"].append({"container_id": container.get('containerId'),
+					                                  "name": container.get('name')})
+				else:
+					version_id, findings, from_cache = audited
+					report["containers_audited"] += 1
+					report["containers_from_cache"] += from_cache
+					findings = {rule_name: result for rule_name, result in findings.items() if result}
+					for rule_name, result in findings.items():
+						report["findings_by_rule"][rule_name] += len(result)
+					if findings:
+						entry = {"container_id": container.get('containerId'), "public_id": container.get('publicId'),
+						         "name": container.get('name'), "live_version_id": version_id, "findings": findings}
+						report["containers"].append(entry)
+			if entry and on_container:
+				on_container(entry)
+			if progress:
+				progress(done, len(containers))
+	finally:
+		# If the caller aborts (e.g. a cancelled job), do not start the remaining containers.
+		executor.shutdown(wait=False, cancel_futures=True)
+
+	print(f"--> [Audit] Audited {report['containers_audited']} containers "
+	      f"({report['containers_from_cache']} from cache), {len(report['failed'])} failed, "
+	      f"{len(report['no_live_version'])} without a live version.")
+	return report
+
+
+def audit_gtm_account(tag_manager_client, account_id: str, rules: list = None, credentials_dict: dict = None,
+                      owner: str = None):
+	"""
+	Starts an audit of the live version of every container in an account as a
+	background job, as it can take longer than a chat request may.
+
+	Args:
+		tag_manager_client: Unused; the job builds a client per worker thread from credentials_dict.
+		account_id (str): The GTM account ID.
+		rules (list): Optional. Names of the audit rules to run. Defaults to all rules.
+		credentials_dict (dict): The user's credentials, injected by run_agent.
+		owner (str): The user's email, injected by run_agent.
+
+	Returns:
+		dict: The job ID and its initial status, to poll with get_gtm_job_status,
+			  or a dictionary with an "error" key.
+	"""
+	# Imported here, as jobs imports this module.
+	from jobs import submit_gtm_job
+
+	error = invalid_rules_error(rules)
+	if error:
+		return error
+	return submit_gtm_job(tag_manager_client, "audit_account", {"account_id": account_id, "rules": rules},
+	                      credentials_dict, owner)
@@ -1,7 +1,5 @@
 # authentication.py
 
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
 
@@ -9,6 +7,10 @@ def get_tag_manager_client(user_credentials_dict):
 	"""
 	Creates a GTM client object from a user's credentials dictionary.
 	"""
+	# Imported here rather than at module level, as these are slow to import on a cold start.
+	from google.oauth2.credentials import Credentials
+	from googleapiclient.discovery import build
+
 	try:
 		# Create credentials object from the dictionary provided by the Flask session
 		credentials = Credentials(**user_credentials_dict)
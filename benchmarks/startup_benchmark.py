@@ -0,0 +1,54 @@
+"""
+Measures the time from process start to the first successful request, with
+eager and lazy imports.
+
+Usage:
+	python benchmarks/startup_benchmark.py [--runs 5]
+
+Every run starts a fresh interpreter, imports main and serves
+GET /api/auth/status through the Flask test client, so the numbers include
+interpreter start-up and all module imports, but no network.
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FIRST_REQUEST_SCRIPT = """
+import main
+response = main.app.test_client().get('/api/auth/status')
+assert response.status_code == 200, response.status_code
+"""
+
+
+def time_to_first_request(startup_mode: str):
+	"""Returns the seconds from spawning the process until the first request succeeded."""
+	env = dict(os.environ, STARTUP_MODE=startup_mode)
+	started = time.perf_counter()
+	subprocess.run([sys.executable, "-c", FIRST_REQUEST_SCRIPT], cwd=REPO_ROOT, env=env, check=True,
+	               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+	return time.perf_counter() - started
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+	parser.add_argument("--runs", type=int, default=5, help="Number of cold starts per startup mode.")
+	args = parser.parse_args()
+
+	medians = {}
+	for startup_mode in ("eager", "lazy"):
+		timings = [time_to_first_request(startup_mode) for _ in range(args.runs)]
+		medians[startup_mode] = statistics.median(timings)
+		print(f"{startup_mode:>5}: median {medians[startup_mode]:.3f}s, "
+		      f"min {min(timings):.3f}s, max {max(timings):.3f}s over {args.runs} runs")
+	print(f"Lazy startup saves {medians['eager'] - medians['lazy']:.3f}s "
+	      f"({1 - medians['lazy'] / medians['eager']:.0%}) to the first successful request.")
+
+
+if __name__ == "__main__":
+	main()
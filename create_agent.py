@@ -1,4 +1,7 @@
-from google_tag_manager_agent.tools import *
+from tools import list_gtm_items, get_gtm_item, compare_gtm_versions, update_gtm_tag_name
+from jobs import submit_gtm_job, get_gtm_job_status, cancel_gtm_job
+from timeline import get_gtm_entity_history
+from audit import audit_gtm_account
 from dotenv import load_dotenv
 from openai import OpenAI
 import os
@@ -17,6 +20,11 @@ def create_agent():
        "get_gtm_item": get_gtm_item,
        "compare_gtm_versions": compare_gtm_versions,
        "update_gtm_tag_name": update_gtm_tag_name,
+       "get_gtm_entity_history": get_gtm_entity_history,
+       "audit_gtm_account": audit_gtm_account,
+       "submit_gtm_job": submit_gtm_job,
+       "get_gtm_job_status": get_gtm_job_status,
+       "cancel_gtm_job": cancel_gtm_job,
     }
 
     tools_schema = [
@@ -24,7 +32,7 @@ def create_agent():
           "type": "function",
           "function": {
              "name": "list_gtm_items",
-             "description": "Get a LIST of all tags, variables, built-in variables, triggers, folders, or container versions from a GTM workspace or container. Use this to find the names and IDs of items.",
+             "description": "Get a LIST of tags, variables, built-in variables, triggers, folders, or container versions from a GTM workspace or container. Use this to find the names and IDs of items. In large containers, narrow the list with the filters and use limit/offset to page through it instead of listing everything; with limit or offset set, the result is {items, next_offset}.",
              "parameters": {
                 "type": "object",
                 "properties": {
@@ -36,7 +44,19 @@ def create_agent():
                       "type": "string",
                       "description": "The type of GTM items to list.",
                       "enum": ["tags", "variables", "built_in_variables", "triggers", "folders", "versions"]
-                   }
+                   },
+                   "name_contains": {"type": "string", "description": "Optional. Only items whose name contains this text (case-insensitive)."},
+                   "item_type": {"type": "string", "description": "Optional. Only items of this GTM type, e.g. 'gaawe' (GA4 event), 'googtag' (Google tag) or 'html' (custom HTML)."},
+                   "folder_id": {"type": "string", "description": "Optional. Only items in the folder with this ID."},
+                   "paused": {"type": "boolean", "description": "Optional. Tags only: true for paused tags, false for active tags."},
+                   "firing_trigger_id": {"type": "string", "description": "Optional. Tags only: only tags fired by the trigger with this ID."},
+                   "fields": {
+                      "type": "array",
+                      "description": "Optional. Extra fields to return per item besides name, id and type, e.g. ['paused', 'parentFolderId', 'firingTriggerId', 'notes'].",
+                      "items": {"type": "string"}
+                   },
+                   "limit": {"type": "integer", "minimum": 1, "description": "Optional. The maximum number of items to return, e.g. 50."},
+                   "offset": {"type": "integer", "minimum": 0, "description": "Optional. The number of matching items to skip; use the next_offset of the previous page."}
                 },
                 "required": ["account_id", "container_id", "information_type"],
              },
@@ -85,6 +105,50 @@ def create_agent():
              },
           },
        },
+       {
+          "type": "function",
+          "function": {
+             "name": "get_gtm_entity_history",
+             "description": "Gets the change history of tags, triggers and variables across ALL container versions in a single call, e.g. to answer 'when did tag X change?'. Returns, oldest first, each version in which a matching entity was added, deleted or modified, with the version name, description and timestamp, and the changed entity (with its changed fields) under 'entity'. The GTM API does not record who created a version; the version name or description often does. Without entity_name or entity_id it returns a per-version summary of changes. Prefer this over chaining compare_gtm_versions calls.",
+             "parameters": {
+                "type": "object",
+                "properties": {
+                   "account_id": {"type": "string", "description": "The GTM account ID."},
+                   "container_id": {"type": "string", "description": "The GTM container ID."},
+                   "entity_type": {
+                      "type": "string",
+                      "description": "Optional. Only return changes of this entity type.",
+                      "enum": ["tag", "trigger", "variable"]
+                   },
+                   "entity_name": {"type": "string", "description": "Optional. Case-insensitive part of the entity name."},
+                   "entity_id": {"type": "string", "description": "Optional. The exact ID of the entity."}
+                },
+                "required": ["account_id", "container_id"],
+             },
+          },
+       },
+       {
+          "type": "function",
+          "function": {
+             "name": "audit_gtm_account",
+             "description": "Starts an audit of the live version of EVERY container in a GTM account as a background job and returns its job_id. Use this for account-wide questions instead of checking containers one by one. Poll get_gtm_job_status with the job_id: each container with findings is a result as soon as it is audited, and the last result is a summary with finding counts per rule.",
+             "parameters": {
+                "type": "object",
+                "properties": {
+                   "account_id": {"type": "string", "description": "The GTM account ID."},
+                   "rules": {
+                      "type": "array",
+                      "description": "Optional. The audit rules to run. Defaults to all rules.",
+                      "items": {
+                         "type": "string",
+                         "enum": ["duplicate_ga4_config", "unused_triggers", "paused_tags", "hardcoded_measurement_ids"]
+                      }
+                   }
+                },
+                "required": ["account_id"],
+             },
+          },
+       },
        {
           "type": "function",
           "function": {
@@ -103,5 +167,55 @@ def create_agent():
              },
           },
        },
+       {
+          "type": "function",
+          "function": {
+             "name": "submit_gtm_job",
+             "description": "Starts a long-running GTM operation as a background job and returns a job ID immediately. Use this instead of many individual calls when comparing many version pairs, auditing every tag in a workspace, or renaming many tags. Tell the user the job ID so they can ask for its progress later.",
+             "parameters": {
+                "type": "object",
+                "properties": {
+                   "operation": {
+                      "type": "string",
+                      "description": "The operation to run. 'compare_versions' needs account_id, container_id and version_pairs (a list of [old_version_id, new_version_id] pairs). 'audit_tags' needs account_id, container_id and workspace_id. 'bulk_rename_tags' needs account_id, container_id, workspace_id and renames (a list of {tag_id, new_tag_name} objects). 'audit_account' needs account_id and optionally rules, like audit_gtm_account.",
+                      "enum": ["compare_versions", "audit_tags", "bulk_rename_tags", "audit_account"]
+                   },
+                   "params": {
+                      "type": "object",
+                      "description": "The parameters for the operation, e.g. {\"account_id\": \"123\", \"container_id\": \"456\", \"version_pairs\": [[\"1\", \"2\"], [\"2\", \"3\"]]}."
+                   }
+                },
+                "required": ["operation", "params"],
+             },
+          },
+       },
+       {
+          "type": "function",
+          "function": {
+             "name": "get_gtm_job_status",
+             "description": "Gets the status, progress and (partial) results of a background job started with submit_gtm_job.",
+             "parameters": {
+                "type": "object",
+                "properties": {
+                   "job_id": {"type": "string", "description": "The ID of the background job."}
+                },
+                "required": ["job_id"],
+             },
+          },
+       },
+       {
+          "type": "function",
+          "function": {
+             "name": "cancel_gtm_job",
+             "description": "Cancels a queued or running background job. Results gathered before the cancellation are kept.",
+             "parameters": {
+                "type": "object",
+                "properties": {
+                   "job_id": {"type": "string", "description": "The ID of the background job."}
+                },
+                "required": ["job_id"],
+             },
+          },
+       },
     ]
     return client, available_tools, tools_schema
\ No newline at end of file
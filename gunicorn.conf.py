@@ -0,0 +1,30 @@
+# gunicorn.conf.py
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8080)}"
+
+# Threaded workers let the admission controller in admission.py queue and
+# schedule /api/chat requests within a worker instead of blocking it outright.
+# Waiting requests hold a thread too, so keep this above
+# ADMISSION_MAX_CONCURRENT + ADMISSION_MAX_QUEUE.
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 48))
+
+# With GUNICORN_PRELOAD=true the app and its heavy modules are imported once in
+# the master and shared copy-on-write by the workers. Only imports happen before
+# the fork; clients and thread pools are still created lazily in each worker.
+preload_app = os.environ.get("GUNICORN_PRELOAD", "false").lower() == "true"
+
+
+def when_ready(server):
+	"""Runs in the master once the port is bound."""
+	if preload_app:
+		from prewarm import prewarm_modules
+		prewarm_modules()
+
+
+def post_worker_init(worker):
+	"""Runs in each worker before it accepts requests; prewarming happens in the background."""
+	from prewarm import start_prewarm
+	start_prewarm()
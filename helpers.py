@@ -0,0 +1,82 @@
+# helpers.py
+
+import os
+import json
+import tempfile
+import threading
+from collections import OrderedDict
+
+from authentication import get_tag_manager_client
+
+
+def lazy_singleton(factory):
+	"""
+	Returns a function that creates factory() on its first call and returns
+	that same instance on every later call, from any thread.
+	"""
+	instance = []
+	lock = threading.Lock()
+
+	def get():
+		with lock:
+			if not instance:
+				instance.append(factory())
+			return instance[0]
+
+	get.__doc__ = f"Returns the process-wide {factory.__name__}, creating it on first use."
+	return get
+
+
+class JsonFileStore:
+	"""Stores JSON documents as one file per name in a directory."""
+
+	def __init__(self, directory: str):
+		self.directory = directory
+		os.makedirs(self.directory, exist_ok=True)
+
+	def path(self, name: str):
+		return os.path.join(self.directory, f"{name}.json")
+
+	def load(self, name: str, default=None):
+		"""Returns the stored document, or default if it does not exist or is unreadable."""
+		try:
+			with open(self.path(name)) as f:
+				return json.load(f)
+		except (FileNotFoundError, json.JSONDecodeError):
+			return default
+
+	def save(self, name: str, document):
+		"""Atomically writes a document, so readers never see a partial file."""
+		fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+		with os.fdopen(fd, "w") as f:
+			json.dump(document, f)
+		os.replace(tmp_path, self.path(name))
+
+	def exists(self, name: str):
+		return os.path.exists(self.path(name))
+
+
+class ThreadLocalClients:
+	"""
+	Tag Manager clients kept per thread, as googleapiclient clients are not
+	thread-safe. Each thread holds at most max_clients clients, keyed e.g. by
+	user, and drops the least recently used one beyond that.
+	"""
+
+	def __init__(self, max_clients: int = 1):
+		self.max_clients = max_clients
+		self._local = threading.local()
+
+	def get(self, key, credentials_dict: dict):
+		"""Returns this thread's client for the key, building it from the credentials if needed."""
+		clients = self._local.__dict__.setdefault('clients', OrderedDict())
+		if key in clients:
+			clients.move_to_end(key)
+			return clients[key]
+		client = get_tag_manager_client(credentials_dict)
+		if client is None:
+			raise ConnectionError("Failed to get Tag Manager client.")
+		clients[key] = client
+		while len(clients) > self.max_clients:
+			clients.popitem(last=False)
+		return client
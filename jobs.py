@@ -0,0 +1,379 @@
+# jobs.py
+
+import os
+import time
+import uuid
+import logging
+import datetime
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from googleapiclient.errors import HttpError
+
+from authentication import get_tag_manager_client
+from tools import compare_gtm_versions, update_gtm_tag_name
+from audit import audit_account
+from prefetch import get_prefetcher
+from helpers import lazy_singleton, JsonFileStore
+
+logger = logging.getLogger(__name__)
+
+# Must be storage shared by every instance for job status polls to work across
+# instances; on Cloud Run it is a mounted Cloud Storage bucket (see run-deploy in
+# Taskfile.yml). The temp directory default only suits a single local process.
+JOBS_DIR = os.environ.get("JOBS_DIR", os.path.join(tempfile.gettempdir(), "gtm_agent_jobs"))
+JOB_MAX_WORKERS = int(os.environ.get("JOB_MAX_WORKERS", 2))
+# Unfinished jobs write a heartbeat this often. Jobs run in the process that
+# accepted them, so a job whose heartbeat is older than JOB_STALE_SECONDS was
+# lost with its instance (e.g. on a redeploy) and is reported as failed.
+JOB_HEARTBEAT_SECONDS = float(os.environ.get("JOB_HEARTBEAT_SECONDS", 30))
+JOB_STALE_SECONDS = float(os.environ.get("JOB_STALE_SECONDS", 120))
+
+# Statuses a job can no longer leave.
+FINISHED_STATUSES = ("succeeded", "failed", "cancelled")
+
+
+class JobCancelled(Exception):
+	"""Raised inside a job operation when the job has been cancelled."""
+
+
+class JobStore:
+	"""
+	Persists job records as one JSON file per job, so that the status endpoint
+	can be served by any worker process sharing the same JOBS_DIR.
+
+	A record is only written by the worker running the job (and once by
+	submit, before the job is queued), so writes never race. Cancellation is
+	requested through a separate flag file that the worker only reads.
+	"""
+
+	def __init__(self, directory: str = JOBS_DIR):
+		self._files = JsonFileStore(directory)
+
+	def save(self, record: dict):
+		"""Atomically writes a job record to disk."""
+		self._files.save(record["id"], record)
+
+	def load(self, job_id: str):
+		"""Returns the job record, or None if no job with this ID exists."""
+		return self._files.load(job_id)
+
+	def request_cancel(self, job_id: str):
+		"""Writes the cancellation flag of a job."""
+		self._files.save(f"{job_id}.cancel", {"requested_at": _now()})
+
+	def cancel_requested(self, job_id: str):
+		return self._files.exists(f"{job_id}.cancel")
+
+
+class Job:
+	"""
+	Handle given to a running job operation to report progress, publish
+	partial results and check for cancellation.
+	"""
+
+	def __init__(self, store: JobStore, record: dict, credentials_dict: dict = None):
+		self.store = store
+		self.record = record
+		# Kept in memory only, for operations that build their own clients.
+		self.credentials_dict = credentials_dict
+		# Serializes writes by the worker and the heartbeat thread.
+		self._lock = threading.Lock()
+
+	@property
+	def id(self):
+		return self.record["id"]
+
+	def progress(self, done: int, total: int = None, message: str = None):
+		"""Records how many units of work are done out of the total."""
+		self.record["progress"] = {"done": done, "total": total, "message": message}
+		self._flush()
+
+	def add_result(self, result):
+		"""Appends a partial result, which is visible to pollers immediately."""
+		self.record["results"].append(result)
+		self._flush()
+
+	def check_cancelled(self):
+		"""Raises JobCancelled if a cancellation was requested for this job."""
+		if self.store.cancel_requested(self.id):
+			raise JobCancelled()
+
+	def _flush(self):
+		with self._lock:
+			self.record["heartbeat_at"] = _now()
+			self.store.save(self.record)
+
+
+# Registry of operations that can be run as a job, keyed by operation name.
+JOB_OPERATIONS = {}
+
+
+def job_operation(name: str):
+	"""Registers a function as a job operation under the given name."""
+
+	def decorator(func):
+		JOB_OPERATIONS[name] = func
+		return func
+
+	return decorator
+
+
+def _now():
+	return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+def _is_stale(record: dict):
+	"""Returns True if an unfinished job has not written a heartbeat for JOB_STALE_SECONDS."""
+	heartbeat_at = datetime.datetime.fromisoformat(record.get("heartbeat_at") or record["created_at"])
+	age = datetime.datetime.now(datetime.timezone.utc) - heartbeat_at
+	return age.total_seconds() > JOB_STALE_SECONDS
+
+
+class JobManager:
+	"""Runs job operations on a bounded worker pool and tracks their records."""
+
+	def __init__(self, store: JobStore = None, max_workers: int = JOB_MAX_WORKERS):
+		self.store = store or JobStore()
+		self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gtm-job")
+		# Unfinished jobs of this process, kept alive by the heartbeat thread.
+		self._jobs = {}
+		self._jobs_lock = threading.Lock()
+		self._heartbeat_thread = None
+
+	def submit(self, operation: str, params: dict, credentials_dict: dict, owner: str = None):
+		"""
+		Queues a job and returns its record immediately.
+
+		The credentials are only held in memory by the worker and are never
+		written to the job record.
+		"""
+		if operation not in JOB_OPERATIONS:
+			return {"error": f"Invalid operation: {operation}. "
+			                 f"Accepted operations are: {', '.join(JOB_OPERATIONS.keys())}"}
+		record = {
+			"id": uuid.uuid4().hex,
+			"operation": operation,
+			"params": params,
+			"owner": owner,
+			"status": "queued",
+			"progress": {"done": 0, "total": None, "message": None},
+			"results": [],
+			"error": None,
+			"created_at": _now(),
+			"started_at": None,
+			"finished_at": None,
+			"heartbeat_at": None,
+		}
+		job = Job(self.store, record, credentials_dict)
+		job._flush()
+		with self._jobs_lock:
+			self._jobs[job.id] = job
+			if self._heartbeat_thread is None:
+				self._heartbeat_thread = threading.Thread(target=self._heartbeat, name="gtm-job-heartbeat",
+				                                          daemon=True)
+				self._heartbeat_thread.start()
+		self._executor.submit(self._run, job)
+		logger.info(f"--> [Jobs] Queued job {record['id']} ({operation}).")
+		return record
+
+	def get(self, job_id: str, owner: str = None):
+		"""
+		Returns a job record, hiding jobs that belong to another user. Unfinished
+		jobs with a stale heartbeat are reported as "failed", and those with a
+		pending cancellation as "cancelling".
+		"""
+		record = self.store.load(job_id)
+		if record is None or (record.get("owner") and record["owner"] != owner):
+			return None
+		if record["status"] not in FINISHED_STATUSES:
+			if _is_stale(record):
+				record.update(status="failed", error="The job stopped running, probably because its instance was "
+				                                     "shut down. Please submit it again.")
+			elif self.store.cancel_requested(job_id):
+				record["status"] = "cancelling"
+		return record
+
+	def cancel(self, job_id: str, owner: str = None):
+		"""
+		Requests cancellation. Running jobs stop at the next unit of work and
+		queued jobs are cancelled when a worker picks them up.
+		"""
+		record = self.get(job_id, owner)
+		if record is None or record["status"] in FINISHED_STATUSES:
+			return record
+		self.store.request_cancel(job_id)
+		return {**record, "status": "cancelling"}
+
+	def _heartbeat(self):
+		while True:
+			time.sleep(JOB_HEARTBEAT_SECONDS)
+			with self._jobs_lock:
+				jobs = list(self._jobs.values())
+			for job in jobs:
+				try:
+					job._flush()
+				except Exception:
+					logger.exception(f"--> [Jobs] Heartbeat of job {job.id} failed.")
+
+	def _run(self, job: Job):
+		try:
+			self._execute(job)
+		finally:
+			with self._jobs_lock:
+				self._jobs.pop(job.id, None)
+
+	def _execute(self, job: Job):
+		record = job.record
+		if self.store.cancel_requested(record["id"]):
+			record.update(status="cancelled", finished_at=_now())
+			job._flush()
+			return
+		record.update(status="running", started_at=_now())
+		job._flush()
+		try:
+			tag_manager_client = get_tag_manager_client(job.credentials_dict)
+			if not tag_manager_client:
+				raise ConnectionError("Failed to get Tag Manager client.")
+			JOB_OPERATIONS[record["operation"]](tag_manager_client, job, **record["params"])
+			record["status"] = "succeeded"
+		except JobCancelled:
+			record["status"] = "cancelled"
+		except HttpError as e:
+			record.update(status="failed", error=f"API Error: {e.resp.status} - {e.content.decode('utf-8')}")
+		except Exception as e:
+			logger.exception(f"--> [Jobs] Job {record['id']} failed.")
+			record.update(status="failed", error=str(e))
+		record["finished_at"] = _now()
+		job._flush()
+		logger.info(f"--> [Jobs] Job {record['id']} finished with status '{record['status']}'.")
+
+
+@job_operation("compare_versions")
+def _compare_versions_job(tag_manager_client, job: Job, account_id: str, container_id: str,
+                          version_pairs: list):
+	"""Compares each [old, new] version pair, publishing one result per pair."""
+	for done, (version_id_old, version_id_new) in enumerate(version_pairs):
+		job.check_cancelled()
+		result = compare_gtm_versions(tag_manager_client, account_id, container_id, version_id_old, version_id_new)
+		job.add_result({"version_id_old": version_id_old, "version_id_new": version_id_new, "diff": result})
+		job.progress(done + 1, len(version_pairs))
+
+
+@job_operation("audit_tags")
+def _audit_tags_job(tag_manager_client, job: Job, account_id: str, container_id: str, workspace_id: str):
+	"""Flags paused tags and tags without firing triggers in a workspace."""
+	parent_path = f"accounts/{account_id}/containers/{container_id}/workspaces/{workspace_id}"
+	method = tag_manager_client.accounts().containers().workspaces().tags().list
+	done = 0
+	next_page_token = None
+	while True:
+		job.check_cancelled()
+		response = method(parent=parent_path, pageToken=next_page_token).execute()
+		for tag in response.get('tag', []):
+			findings = []
+			if tag.get('paused'):
+				findings.append("Tag is paused.")
+			if not tag.get('firingTriggerId'):
+				findings.append("Tag has no firing triggers.")
+			if findings:
+				job.add_result({"name": tag.get('name'), "id": tag.get('tagId'), "findings": findings})
+			done += 1
+		job.progress(done, message=f"Audited {done} tags.")
+		next_page_token = response.get("nextPageToken")
+		if not next_page_token:
+			break
+
+
+@job_operation("bulk_rename_tags")
+def _bulk_rename_tags_job(tag_manager_client, job: Job, account_id: str, container_id: str, workspace_id: str,
+                          renames: list):
+	"""Renames tags one by one; each rename is {"tag_id": ..., "new_tag_name": ...}."""
+	for done, rename in enumerate(renames):
+		job.check_cancelled()
+		updated = update_gtm_tag_name(tag_manager_client, account_id, container_id, workspace_id,
+		                              rename["tag_id"], rename["new_tag_name"])
+		# Do not let the agent read the old name back from a prefetched copy.
+		get_prefetcher().invalidate(job.record["owner"], account_id, container_id, workspace_id, "tags",
+		                            rename["tag_id"])
+		job.add_result({"tag_id": rename["tag_id"], "new_tag_name": rename["new_tag_name"],
+		                "error": updated.get("error")})
+		job.progress(done + 1, len(renames))
+
+
+@job_operation("audit_account")
+def _audit_account_job(tag_manager_client, job: Job, account_id: str, rules: list = None):
+	"""
+	Audits every container in an account. Each container with findings (or that
+	failed) is published as soon as it is audited, so a cancelled job keeps what
+	it found; the aggregated counts follow as the last result.
+	"""
+
+	def progress(done, total):
+		job.check_cancelled()
+		job.progress(done, total, message=f"Audited {done} of {total} containers.")
+
+	report = audit_account(job.credentials_dict, account_id, rules, progress=progress,
+	                       on_container=lambda entry: job.add_result({"container": entry}))
+	if "error" in report:
+		raise ValueError(report["error"])
+	job.add_result({"summary": {key: value for key, value in report.items() if key not in ("containers", "failed")}})
+
+
+get_job_manager = lazy_singleton(JobManager)
+
+
+def _summarize_job(record: dict):
+	"""Strips a job record down to what the agent needs to report on it."""
+	if record is None:
+		return {"error": "No job found with this ID."}
+	if "error" in record and "id" not in record:
+		return record
+	return {key: record[key] for key in ("id", "operation", "status", "progress", "results", "error")}
+
+
+def submit_gtm_job(tag_manager_client, operation: str, params: dict, credentials_dict: dict = None,
+                   owner: str = None):
+	"""
+	Submits a long-running GTM operation as a background job.
+
+	Args:
+		tag_manager_client: Unused; jobs build their own client from credentials_dict.
+		operation (str): One of the registered JOB_OPERATIONS.
+		params (dict): Keyword arguments for the operation.
+		credentials_dict (dict): The user's credentials, injected by run_agent.
+		owner (str): The user's email, injected by run_agent.
+
+	Returns:
+		dict: The job ID and its initial status, or a dictionary with an "error" key.
+	"""
+	record = get_job_manager().submit(operation, params, credentials_dict, owner)
+	if "error" in record:
+		return record
+	return {"job_id": record["id"], "status": record["status"]}
+
+
+def get_gtm_job_status(tag_manager_client, job_id: str, credentials_dict: dict = None, owner: str = None):
+	"""
+	Returns the status, progress and (partial) results of a background job.
+
+	Args:
+		tag_manager_client: Unused.
+		job_id (str): The ID returned by submit_gtm_job.
+		credentials_dict (dict): Unused, injected by run_agent.
+		owner (str): The user's email, injected by run_agent.
+	"""
+	return _summarize_job(get_job_manager().get(job_id, owner))
+
+
+def cancel_gtm_job(tag_manager_client, job_id: str, credentials_dict: dict = None, owner: str = None):
+	"""
+	Cancels a queued or running background job.
+
+	Args:
+		tag_manager_client: Unused.
+		job_id (str): The ID returned by submit_gtm_job.
+		credentials_dict (dict): Unused, injected by run_agent.
+		owner (str): The user's email, injected by run_agent.
+	"""
+	return _summarize_job(get_job_manager().cancel(job_id, owner))
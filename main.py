@@ -1,19 +1,33 @@
 import os
+import logging
 import flask
 from flask import Flask, jsonify, request, render_template
 from flask_cors import CORS
-from googleapiclient.errors import HttpError
-from google_auth_oauthlib.flow import Flow
-from google.oauth2.credentials import Credentials
-import google.auth.transport.requests
-import requests
 from functools import wraps
-from run_agent import run_agent
+from jobs import get_job_manager
+from audit import invalid_rules_error
+from prefetch import get_prefetcher
+from workspace_mirror import get_mirror_registry
+from routing import get_model_router
+from admission import AdmissionRejected, get_admission_controller
 from authentication import *
+from prewarm import prewarm_modules, start_prewarm
 from dotenv import load_dotenv
 
 load_dotenv()
 ENVIRONMENT = os.environ.get("ENVIRONMENT", "production")
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+       logging.StreamHandler()
+    ]
+)
+# "lazy" defers the Google API, OAuth and OpenAI imports until first use (or until
+# the background prewarm gets to them); "eager" imports everything at load time.
+STARTUP_MODE = os.environ.get("STARTUP_MODE", "lazy")
+if STARTUP_MODE == "eager":
+    prewarm_modules()
 
 app = Flask(__name__)
 
@@ -51,6 +65,7 @@ def login_required(f):
 
 @app.route('/login')
 def login():
+    from google_auth_oauthlib.flow import Flow
     flow = Flow.from_client_config(
         client_config=CLIENT_SECRETS_CONFIG,
         scopes=SCOPES,
@@ -71,6 +86,8 @@ def logout():
 
 @app.route('/oauth2callback')
 def oauth2callback():
+    from google_auth_oauthlib.flow import Flow
+    import google.auth.transport.requests
     state = flask.session.get('state')
     if not state or state != request.args.get('state'):
         return "State mismatch. Possible CSRF attack.", 400
@@ -144,9 +161,27 @@ def api_get_workspaces():
     return jsonify(workspaces)
 
 
+@app.route('/api/audit', methods=['POST'])
+@login_required
+def api_audit_account():
+    """Starts an account audit as a background job; poll /api/jobs/<job_id> for the results."""
+    account_id = request.args.get('accountId')
+    if not account_id:
+       return jsonify({"error": "accountId parameter is required"}), 400
+    rules = request.args.get('rules')
+    rules = rules.split(',') if rules else None
+    error = invalid_rules_error(rules)
+    if error:
+       return jsonify(error), 400
+    job = get_job_manager().submit("audit_account", {"account_id": account_id, "rules": rules},
+                                   flask.session['credentials'], owner=flask.session.get('user_info', {}).get('email'))
+    return jsonify({"job_id": job["id"], "status": job["status"]}), 202
+
+
 @app.route('/api/chat', methods=['POST'])
 @login_required
 def api_chat():
+    from run_agent import run_agent
     data = request.json
     question = data.get('question')
     history = data.get('history', [])
@@ -154,16 +189,51 @@ def api_chat():
     if not all([question, context.get('accountId'), context.get('containerId'), context.get('workspaceId')]):
        return jsonify({"error": "Missing required fields"}), 400
 
-    answer, updated_history = run_agent(
-       question=question,
-       messages=history,
-       account_id=context.get('accountId'),
-       container_id=context.get('containerId'),
-       workspace_id=context.get('workspaceId'),
-       credentials_dict=flask.session['credentials']
-    )
+    user_email = flask.session.get('user_info', {}).get('email')
+    try:
+       with get_admission_controller().admit(user_email or request.remote_addr):
+          answer, updated_history = run_agent(
+             question=question,
+             messages=history,
+             account_id=context.get('accountId'),
+             container_id=context.get('containerId'),
+             workspace_id=context.get('workspaceId'),
+             credentials_dict=flask.session['credentials'],
+             user_email=user_email
+          )
+    except AdmissionRejected as e:
+       response = jsonify({"error": str(e), "retry_after": e.retry_after})
+       response.headers['Retry-After'] = str(e.retry_after)
+       return response, 429
     return jsonify({"answer": answer, "history": updated_history})
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@login_required
+def api_get_job(job_id):
+    job = get_job_manager().get(job_id, owner=flask.session.get('user_info', {}).get('email'))
+    if job is None:
+       return jsonify({"error": "Job not found."}), 404
+    return jsonify(job)
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+@login_required
+def api_cancel_job(job_id):
+    job = get_job_manager().cancel(job_id, owner=flask.session.get('user_info', {}).get('email'))
+    if job is None:
+       return jsonify({"error": "Job not found."}), 404
+    return jsonify(job)
+
+@app.route('/api/metrics', methods=['GET'])
+@login_required
+def api_metrics():
+    """Per-process counters, for dashboards and debugging."""
+    return jsonify({
+       "admission": get_admission_controller().stats(),
+       "prefetch": get_prefetcher().stats(),
+       "workspace_mirror": get_mirror_registry().stats(),
+       "models": get_model_router().stats(),
+    })
+
 @app.route("/")
 def home():
     """Serves the main HTML page."""
@@ -173,6 +243,8 @@ if __name__ == '__main__':
     port = int(os.environ.get("PORT", 8080))
     use_ssl = ENVIRONMENT != "production" and os.path.exists("../cert.pem") and os.path.exists("../key.pem")
     ssl_context = ("../cert.pem", "../key.pem") if use_ssl else None
+    if STARTUP_MODE == "lazy":
+        start_prewarm()
     if ENVIRONMENT == "production":
         print("🚀 Starting GTM Agent in production mode..")
         app.run(host="0.0.0.0", port=port)
@@ -0,0 +1,144 @@
+# prefetch.py
+
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from tools import get_gtm_item
+from helpers import lazy_singleton, ThreadLocalClients
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_ENABLED = os.environ.get("PREFETCH_ENABLED", "true").lower() == "true"
+# The maximum number of items prefetched for a single list result.
+PREFETCH_MAX_ITEMS = int(os.environ.get("PREFETCH_MAX_ITEMS", 10))
+PREFETCH_MAX_WORKERS = int(os.environ.get("PREFETCH_MAX_WORKERS", 4))
+# Prefetches share the user's GTM API quota, so they are capped at
+# PREFETCH_BUDGET requests per PREFETCH_BUDGET_WINDOW_SECONDS per process.
+PREFETCH_BUDGET = int(os.environ.get("PREFETCH_BUDGET", 20))
+PREFETCH_BUDGET_WINDOW_SECONDS = float(os.environ.get("PREFETCH_BUDGET_WINDOW_SECONDS", 100))
+# About one agent turn. Renames through this process invalidate entries directly, but
+# other instances only notice changes once their entries expire.
+PREFETCH_TTL_SECONDS = float(os.environ.get("PREFETCH_TTL_SECONDS", 120))
+# The number of users whose clients each prefetch thread keeps.
+PREFETCH_CLIENTS_PER_THREAD = int(os.environ.get("PREFETCH_CLIENTS_PER_THREAD", 8))
+# How long a get_gtm_item call waits for a prefetch that is still in flight.
+PREFETCH_WAIT_SECONDS = float(os.environ.get("PREFETCH_WAIT_SECONDS", 10))
+
+# Item types that support get_gtm_item and are small enough to prefetch.
+PREFETCHABLE_TYPES = ("tags", "variables", "triggers", "folders")
+
+
+class _Budget:
+	"""A sliding-window limit on the number of prefetch requests."""
+
+	def __init__(self, limit: int, window_seconds: float):
+		self.limit = limit
+		self.window_seconds = window_seconds
+		self._timestamps = []
+		self._lock = threading.Lock()
+
+	def try_acquire(self):
+		with self._lock:
+			now = time.monotonic()
+			self._timestamps = [t for t in self._timestamps if now - t < self.window_seconds]
+			if len(self._timestamps) >= self.limit:
+				return False
+			self._timestamps.append(now)
+			return True
+
+
+class Prefetcher:
+	"""
+	Fetches the full bodies of listed items in the background, so that the
+	get_gtm_item calls the model usually makes next are served from memory.
+	Entries are scoped per user and expire after PREFETCH_TTL_SECONDS.
+	"""
+
+	def __init__(self, max_workers: int = PREFETCH_MAX_WORKERS):
+		self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gtm-prefetch")
+		self._budget = _Budget(PREFETCH_BUDGET, PREFETCH_BUDGET_WINDOW_SECONDS)
+		self._entries = {}
+		self._lock = threading.Lock()
+		self._clients = ThreadLocalClients(max_clients=PREFETCH_CLIENTS_PER_THREAD)
+		self._stats = {"prefetched": 0, "hits": 0, "misses": 0, "skipped_over_budget": 0}
+
+	def prefetch(self, owner: str, credentials_dict: dict, account_id: str, container_id: str, workspace_id: str,
+	             information_type: str, items: list):
+		"""Starts background fetches for the first PREFETCH_MAX_ITEMS listed items."""
+		if information_type not in PREFETCHABLE_TYPES or not workspace_id:
+			return 0
+		with self._lock:
+			now = time.monotonic()
+			self._entries = {key: entry for key, entry in self._entries.items()
+			                 if now - entry[0] < PREFETCH_TTL_SECONDS}
+		started = 0
+		for item in items[:PREFETCH_MAX_ITEMS]:
+			key = (owner, account_id, container_id, workspace_id, information_type, str(item.get('id')))
+			with self._lock:
+				entry = self._entries.get(key)
+				if entry and time.monotonic() - entry[0] < PREFETCH_TTL_SECONDS:
+					continue
+			if not self._budget.try_acquire():
+				self._count("skipped_over_budget")
+				break
+			future = self._executor.submit(self._fetch, owner, credentials_dict, key)
+			with self._lock:
+				self._entries[key] = (time.monotonic(), future)
+			started += 1
+		if started:
+			logger.info(f"--> [Prefetch] Prefetching {started} {information_type}.")
+		return started
+
+	def _fetch(self, owner: str, credentials_dict: dict, key: tuple):
+		_, account_id, container_id, workspace_id, information_type, item_id = key
+		result = get_gtm_item(self._clients.get(owner, credentials_dict), account_id, container_id, workspace_id,
+		                      information_type, item_id)
+		self._count("prefetched")
+		if not isinstance(result, dict) or "error" in result or "message" in result:
+			# Do not serve failures from memory; the model's own call will retry.
+			self.invalidate(owner, account_id, container_id, workspace_id, information_type, item_id)
+			return None
+		return result
+
+	def get(self, owner: str, account_id: str, container_id: str, workspace_id: str, information_type: str,
+	        item_id: str):
+		"""
+		Returns a prefetched item, waiting for it if still in flight, or None on a
+		miss. Only lookups of PREFETCHABLE_TYPES count towards the hit rate.
+		"""
+		if information_type not in PREFETCHABLE_TYPES or not workspace_id:
+			return None
+		key = (owner, account_id, container_id, workspace_id, information_type, str(item_id))
+		with self._lock:
+			entry = self._entries.get(key)
+		result = None
+		if entry and time.monotonic() - entry[0] < PREFETCH_TTL_SECONDS:
+			try:
+				result = entry[1].result(timeout=PREFETCH_WAIT_SECONDS)
+			except Exception as e:
+				logger.warning(f"--> [Prefetch] Prefetch of {information_type} {item_id} failed: {e}")
+		self._count("hits" if result is not None else "misses")
+		return result
+
+	def _count(self, counter: str):
+		with self._lock:
+			self._stats[counter] += 1
+
+	def invalidate(self, owner: str, account_id: str, container_id: str, workspace_id: str, information_type: str,
+	               item_id: str):
+		"""Drops an item from memory, e.g. after it was updated."""
+		with self._lock:
+			self._entries.pop((owner, account_id, container_id, workspace_id, information_type, str(item_id)), None)
+
+	def stats(self):
+		"""Returns the prefetch counters and the hit rate of get_gtm_item calls."""
+		with self._lock:
+			stats = dict(self._stats)
+		lookups = stats["hits"] + stats["misses"]
+		return {**stats, "hit_rate": stats["hits"] / lookups if lookups else None}
+
+
+get_prefetcher = lazy_singleton(Prefetcher)
@@ -0,0 +1,47 @@
+# prewarm.py
+
+import time
+import logging
+import importlib
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Modules that are slow to import and are not needed to serve the first request.
+HEAVY_MODULES = [
+	"google.oauth2.credentials",
+	"google.auth.transport.requests",
+	"googleapiclient.discovery",
+	"google_auth_oauthlib.flow",
+	"openai",
+	"run_agent",
+]
+
+_prewarm_thread = None
+_prewarm_lock = threading.Lock()
+
+
+def prewarm_modules():
+	"""
+	Imports the heavy modules so later requests find them in sys.modules.
+
+	Only imports modules and creates no clients, threads or sockets, so it is
+	also safe to call in the gunicorn master before workers are forked.
+	"""
+	started = time.perf_counter()
+	for module_name in HEAVY_MODULES:
+		try:
+			importlib.import_module(module_name)
+		except Exception as e:
+			logger.warning(f"--> [Prewarm] Could not import {module_name}: {e}")
+	logger.info(f"--> [Prewarm] Imported heavy modules in {time.perf_counter() - started:.2f}s.")
+
+
+def start_prewarm():
+	"""Prewarms in a background thread, at most once per process."""
+	global _prewarm_thread
+	with _prewarm_lock:
+		if _prewarm_thread is None:
+			_prewarm_thread = threading.Thread(target=prewarm_modules, name="prewarm", daemon=True)
+			_prewarm_thread.start()
+		return _prewarm_thread
@@ -0,0 +1,155 @@
+# routing.py
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+
+from helpers import lazy_singleton
+
+logger = logging.getLogger(__name__)
+
+# Models ordered from fastest to most capable.
+MODEL_TIERS = [model.strip() for model in
+               os.environ.get("MODEL_TIERS", "openai/gpt-4o-mini,openai/gpt-4o").split(",") if model.strip()]
+# Tried when the chosen model times out or errors. When the chosen model is the
+# fallback itself, the next most capable other tier is tried instead.
+MODEL_FALLBACK = os.environ.get("MODEL_FALLBACK", MODEL_TIERS[-1])
+# The wall-clock time a turn should ideally take. The fast tier is used once the
+# expected latency of the capable tier no longer fits in what is left of it.
+ROUTING_LATENCY_BUDGET_SECONDS = float(os.environ.get("ROUTING_LATENCY_BUDGET_SECONDS", 30))
+# Prompts larger than this go to the most capable tier.
+ROUTING_LARGE_PROMPT_TOKENS = int(os.environ.get("ROUTING_LARGE_PROMPT_TOKENS", 12000))
+# Tool results larger than this need summarising, which also goes to the most capable tier.
+ROUTING_LARGE_TOOL_RESULT_TOKENS = int(os.environ.get("ROUTING_LARGE_TOOL_RESULT_TOKENS", 2000))
+ROUTING_CALL_TIMEOUT_SECONDS = float(os.environ.get("ROUTING_CALL_TIMEOUT_SECONDS", 60))
+# The share of a call's timeout the first attempt may use; the rest is left for the fallback.
+ROUTING_FIRST_ATTEMPT_SHARE = float(os.environ.get("ROUTING_FIRST_ATTEMPT_SHARE", 0.6))
+
+# Tools whose results are diffs or reports that need careful reasoning to explain.
+COMPLEX_TOOLS = {"compare_gtm_versions", "get_gtm_entity_history", "audit_gtm_account", "get_gtm_job_status"}
+
+# Number of recent latencies kept per model for the percentile metrics.
+LATENCY_SAMPLES = 200
+
+
+def estimate_tokens(messages: list):
+	"""
+	Roughly estimates the number of tokens in a list of messages.
+
+	Uses ~4 characters per token rather than tiktoken, as loading a tiktoken
+	encoding can require a download and this only needs to pick a tier.
+	"""
+	return sum(len(json.dumps(message, default=str)) for message in messages) // 4
+
+
+class ModelRouter:
+	"""
+	Picks the model for each iteration of the agent loop and records per-model
+	latency and token usage.
+
+	Results of diff and audit tools always go to the most capable tier, as do
+	large prompts and large tool results unless the turn's latency budget no
+	longer leaves room for that tier's median latency. Everything else, such as
+	deciding which tool to call or formatting a small tool result, goes to the
+	fastest tier.
+	"""
+
+	def __init__(self, tiers: list = None, fallback: str = MODEL_FALLBACK):
+		self.tiers = tiers or MODEL_TIERS
+		self.fallback = fallback
+		self._lock = threading.Lock()
+		self._stats = {}
+
+	def choose(self, messages: list, elapsed_seconds: float, latency_budget_seconds: float = ROUTING_LATENCY_BUDGET_SECONDS):
+		"""Returns the model to use for the next call and the reason, for logging."""
+		fast, capable = self.tiers[0], self.tiers[-1]
+		trailing_tool_messages = []
+		for message in reversed(messages):
+			if message.get("role") != "tool":
+				break
+			trailing_tool_messages.append(message)
+
+		if any(message.get("name") in COMPLEX_TOOLS for message in trailing_tool_messages):
+			# Diffs and audit reports always get the most capable model.
+			return capable, "complex tool result"
+		if estimate_tokens(messages) > ROUTING_LARGE_PROMPT_TOKENS:
+			reason = "large prompt"
+		elif estimate_tokens(trailing_tool_messages) > ROUTING_LARGE_TOOL_RESULT_TOKENS:
+			reason = "large tool result"
+		else:
+			# Deciding which tool to call next, or formatting a small result.
+			return fast, "small tool result" if trailing_tool_messages else "planning"
+		expected_seconds = self._median_latency(capable)
+		if expected_seconds is not None and expected_seconds > latency_budget_seconds - elapsed_seconds:
+			return fast, f"{reason}, over latency budget"
+		return capable, reason
+
+	def complete(self, client, model: str, timeout: float = None, **kwargs):
+		"""
+		Calls the chat completions API with the given model, retrying once with the
+		fallback model on a timeout or error.
+
+		The first attempt may use ROUTING_FIRST_ATTEMPT_SHARE of the timeout and
+		the fallback gets whatever is left. The SDK's own retries are disabled, as
+		they would stretch a single attempt past its share.
+
+		Returns:
+			tuple: The response and the model that produced it.
+		"""
+		timeout = min(timeout, ROUTING_CALL_TIMEOUT_SECONDS) if timeout is not None else ROUTING_CALL_TIMEOUT_SECONDS
+		deadline = time.monotonic() + timeout
+		fallback = next((candidate for candidate in [self.fallback] + self.tiers[::-1] if candidate != model), None)
+		models = [model] + ([fallback] if fallback else [])
+		completions = client.with_options(max_retries=0).chat.completions
+		for attempt, attempt_model in enumerate(models):
+			started = time.monotonic()
+			is_last = attempt == len(models) - 1
+			attempt_timeout = (deadline - started) * (1 if is_last else ROUTING_FIRST_ATTEMPT_SHARE)
+			try:
+				response = completions.create(model=attempt_model, timeout=attempt_timeout, **kwargs)
+			except Exception as e:
+				self._record(attempt_model, time.monotonic() - started, error=True)
+				if is_last or time.monotonic() >= deadline:
+					raise
+				logger.warning(f"--> [Routing] {attempt_model} failed ({e}), falling back to {models[attempt + 1]}.")
+				continue
+			self._record(attempt_model, time.monotonic() - started, usage=getattr(response, "usage", None))
+			return response, attempt_model
+
+	def _record(self, model: str, latency_seconds: float, usage=None, error: bool = False):
+		with self._lock:
+			stats = self._stats.setdefault(model, {
+				"calls": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0,
+				"latencies": deque(maxlen=LATENCY_SAMPLES)})
+			stats["calls"] += 1
+			if error:
+				stats["errors"] += 1
+				return
+			stats["latencies"].append(latency_seconds)
+			if usage is not None:
+				stats["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+				stats["completion_tokens"] += getattr(usage, "completion_tokens", 0) or 0
+
+	def _median_latency(self, model: str):
+		with self._lock:
+			latencies = sorted(self._stats.get(model, {}).get("latencies", []))
+		return latencies[len(latencies) // 2] if latencies else None
+
+	def stats(self):
+		"""Returns per-model call counts, errors, token usage and latency percentiles."""
+		with self._lock:
+			result = {}
+			for model, stats in self._stats.items():
+				latencies = sorted(stats["latencies"])
+				result[model] = {
+					**{key: value for key, value in stats.items() if key != "latencies"},
+					"latency_seconds_p50": latencies[len(latencies) // 2] if latencies else None,
+					"latency_seconds_p95": latencies[int(len(latencies) * 0.95)] if latencies else None,
+				}
+			return result
+
+
+get_model_router = lazy_singleton(ModelRouter)
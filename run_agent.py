@@ -1,39 +1,89 @@
 from create_agent import create_agent
 from authentication import get_tag_manager_client
+from prefetch import PREFETCH_ENABLED, PREFETCHABLE_TYPES, get_prefetcher
+from workspace_mirror import WORKSPACE_MIRROR_ENABLED, get_mirror_registry
+from routing import ROUTING_LATENCY_BUDGET_SECONDS, get_model_router
 from datetime import date
 import json
+import os
+import time
+
+# Limits per turn, so a single question cannot hold a worker indefinitely.
+AGENT_MAX_ITERATIONS = int(os.environ.get("AGENT_MAX_ITERATIONS", 10))
+AGENT_TURN_BUDGET_SECONDS = float(os.environ.get("AGENT_TURN_BUDGET_SECONDS", 120))
+
+# Tools that need the caller's credentials and identity rather than a shared client.
+CONTEXT_AWARE_TOOLS = {"submit_gtm_job", "get_gtm_job_status", "cancel_gtm_job", "audit_gtm_account"}
 
 def run_agent(question: str,
               messages: list = None,
               account_id: str = None,
               container_id: str = None,
               workspace_id: str = None,
-              credentials_dict: dict = None):
+              credentials_dict: dict = None,
+              user_email: str = None,
+              prefetch: bool = PREFETCH_ENABLED,
+              workspace_mirror: bool = WORKSPACE_MIRROR_ENABLED,
+              max_iterations: int = AGENT_MAX_ITERATIONS,
+              time_budget_seconds: float = AGENT_TURN_BUDGET_SECONDS,
+              latency_budget_seconds: float = ROUTING_LATENCY_BUDGET_SECONDS):
     """
     Runs the agent for a single turn, with robust history and output processing.
+
+    The turn ends with an explanatory answer once it has used max_iterations model
+    calls or time_budget_seconds of wall-clock time. The model for each call is
+    picked by the ModelRouter, which aims to finish within latency_budget_seconds.
+
+    With prefetch enabled, the full bodies of items returned by list_gtm_items are
+    fetched in the background, and later get_gtm_item calls are served from memory.
+    With workspace_mirror enabled, workspace items are listed and read from a local
+    mirror that is refreshed incrementally; prefetching then only kicks in for calls
+    the mirror cannot serve, e.g. when its refresh failed.
     """
+    turn_started = time.monotonic()
     client, available_tools, tools_schema = create_agent()
+    router = get_model_router()
     print(f"\n🙋 User Question: {question}")
 
     tag_manager_client = get_tag_manager_client(credentials_dict)
 
     conversation_history = messages if messages is not None else []
 
+    # Prefetched and mirrored items are scoped per user, so both need to know who is asking.
+    prefetcher = get_prefetcher() if prefetch and user_email else None
+    mirror_registry = get_mirror_registry() if workspace_mirror and user_email else None
+    prefetch_hits, prefetch_lookups = 0, 0
+
     system_content = (
 	    f"You are a seasoned Google Tag Manager specialist.\n"
-	    f"Today's date is {date.today().strftime("%Y-%m-%d")}.\n"
+	    f"Today's date is {date.today().strftime('%Y-%m-%d')}.\n"
 	    f"The user's context is Account ID: {account_id}, Container ID: {container_id}, and Workspace ID: {workspace_id}.\n"
-        f"The output from the tools often consists of JSON data, put some effort in nice formatting for the end user in a non-technical way"
+        f"The output from the tools often consists of JSON data, put some effort in nice formatting for the end user in a non-technical way.\n"
+        f"For large operations, such as comparing many versions, auditing every tag or renaming many tags, submit a background job and give the user the job ID instead of making many individual calls."
     )
 
     system_prompt = {"role": "system", "content": system_content}
     conversation_history.append({"role": "user", "content": question})
 
+    iteration = 0
     while True:
+       remaining_seconds = time_budget_seconds - (time.monotonic() - turn_started)
+       if iteration >= max_iterations or remaining_seconds <= 0:
+          print(f"⏱️ Turn budget exhausted after {iteration} iterations and {time.monotonic() - turn_started:.1f}s.")
+          budget_message = "Sorry, this question needed more steps than I can take in one turn. Please ask a more specific question, or ask me to run it as a background job."
+          conversation_history.append({"role": "assistant", "content": budget_message})
+          return budget_message, conversation_history
+       iteration += 1
+
        messages_to_send = [system_prompt] + conversation_history
        try:
-          response = client.chat.completions.create(
-             model="openai/gpt-4o",
+          model, routing_reason = router.choose(messages_to_send, time.monotonic() - turn_started,
+                                                latency_budget_seconds)
+          print(f"🧭 Iteration {iteration}: using {model} ({routing_reason}).")
+          response, _ = router.complete(
+             client,
+             model,
+             timeout=remaining_seconds,
              messages=messages_to_send,
              tools=tools_schema,
              tool_choice="auto"
@@ -74,6 +124,8 @@ def run_agent(question: str,
        if not response_message.tool_calls:
           final_answer = response_message.content
           print("🤖 Agent Answer (No Tool):", final_answer)
+          if prefetch_lookups:
+              print(f"📦 Prefetch hit rate this turn: {prefetch_hits}/{prefetch_lookups}")
           return final_answer, conversation_history
 
        print("✅ Agent decided to use a tool.")
@@ -99,8 +151,35 @@ def run_agent(question: str,
 
           try:
               function_args = json.loads(tool_call.function.arguments)
-              print(f"▶️ Calling function: {function_name} with args: {function_args}")
-              raw_content = function_to_call(tag_manager_client, **function_args)
+              if function_name in CONTEXT_AWARE_TOOLS:
+                  function_args.update(credentials_dict=credentials_dict, owner=user_email)
+              print(f"▶️ Calling function: {function_name} with args: {tool_call.function.arguments}")
+              item_scope = (user_email, function_args.get("account_id"), function_args.get("container_id"),
+                            function_args.get("workspace_id"))
+              raw_content = None
+              served_from_mirror = False
+              if mirror_registry:
+                  raw_content = mirror_registry.serve(tag_manager_client, user_email, function_name, function_args)
+                  served_from_mirror = raw_content is not None
+              if (prefetcher and function_name == "get_gtm_item" and not served_from_mirror
+                      and function_args.get("information_type") in PREFETCHABLE_TYPES):
+                  raw_content = prefetcher.get(*item_scope, function_args.get("information_type"),
+                                               function_args.get("item_id"))
+                  prefetch_lookups += 1
+                  prefetch_hits += raw_content is not None
+              if raw_content is None:
+                  raw_content = function_to_call(tag_manager_client, **function_args)
+              if prefetcher and function_name == "list_gtm_items" and not served_from_mirror:
+                  listed_items = raw_content.get("items") if isinstance(raw_content, dict) else raw_content
+                  if isinstance(listed_items, list):
+                      prefetcher.prefetch(user_email, credentials_dict, *item_scope[1:],
+                                          function_args.get("information_type"), listed_items)
+              if prefetcher and function_name == "update_gtm_tag_name":
+                  prefetcher.invalidate(*item_scope, "tags", function_args.get("tag_id"))
+              if mirror_registry and function_name == "update_gtm_tag_name" and "error" not in raw_content:
+                  mirror = mirror_registry.get(*item_scope, create=False)
+                  if mirror:
+                      mirror.upsert("tags", raw_content)
               processed_content = json.dumps(raw_content, indent=2)
               print(f"✅ Tool output: {processed_content[:500]}...")
 
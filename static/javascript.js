@@ -63,6 +63,11 @@ document.addEventListener('DOMContentLoaded', async () => {
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({ question, history, context })
             });
+            if (response.status === 429) {
+                const retryAfter = response.headers.get('Retry-After') || 'a few';
+                const busyMessage = `The agent is busy right now. Please try again in ${retryAfter} seconds.`;
+                return { answer: busyMessage, history };
+            }
             if (!response.ok) throw new Error('Agent request failed');
             return await response.json();
         } catch (error) {
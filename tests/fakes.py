@@ -0,0 +1,32 @@
+from googleapiclient.errors import HttpError
+
+
+class FakeRequest:
+	def __init__(self, result, log: list = None, name: str = None):
+		self.result = result
+		self.log = log
+		self.name = name
+
+	def execute(self):
+		if self.log is not None:
+			self.log.append(self.name)
+		if isinstance(self.result, Exception):
+			raise self.result
+		return self.result
+
+
+def http_error(status: int):
+	return HttpError(type("Response", (), {"status": status, "reason": ""})(), b"{}")
+
+
+def paged(items: list, key: str, page_size: int, log: list = None, name: str = None):
+	"""Returns a fake list method serving the items page_size at a time, with page tokens."""
+
+	def method(parent=None, pageToken=None, **kwargs):
+		start = int(pageToken or 0)
+		response = {key: items[start:start + page_size]}
+		if start + page_size < len(items):
+			response["nextPageToken"] = str(start + page_size)
+		return FakeRequest(response, log, name)
+
+	return method
@@ -0,0 +1,94 @@
+import time
+import threading
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected
+
+
+def _wait_for(condition, timeout=2.0):
+	deadline = time.monotonic() + timeout
+	while not condition():
+		assert time.monotonic() < deadline, "condition not reached in time"
+		time.sleep(0.001)
+
+
+def _queue(controller, user, granted):
+	"""Starts a thread that waits for a slot, records the grant and releases right away."""
+
+	def run():
+		controller.acquire(user)
+		granted.append(user)
+		controller.release(user)
+
+	queue_depth = controller.stats()["queue_depth"]
+	thread = threading.Thread(target=run)
+	thread.start()
+	# Wait until the request is queued, so the queue order is the order of the calls.
+	_wait_for(lambda: controller.stats()["queue_depth"] == queue_depth + 1)
+	return thread
+
+
+def test_admits_immediately_when_under_the_limits():
+	controller = AdmissionController(max_concurrent=2, max_per_user=1, max_queue=4, max_wait_seconds=1)
+	controller.acquire("a")
+	controller.acquire("b")
+	stats = controller.stats()
+	assert stats["running"] == 2
+	assert stats["queue_depth"] == 0
+	assert stats["admitted"] == 2
+
+
+def test_per_user_limit_does_not_block_other_users():
+	controller = AdmissionController(max_concurrent=4, max_per_user=1, max_queue=4, max_wait_seconds=0.05)
+	controller.acquire("a")
+	controller.acquire("b")
+	with pytest.raises(AdmissionRejected):
+		controller.acquire("a")
+
+
+def test_waiting_users_are_served_round_robin():
+	controller = AdmissionController(max_concurrent=1, max_per_user=1, max_queue=10, max_wait_seconds=5)
+	controller.acquire("holder")
+	granted = []
+	threads = [_queue(controller, user, granted) for user in ["a", "a", "a", "b", "c"]]
+	controller.release("holder")
+	for thread in threads:
+		thread.join(timeout=5)
+	assert granted == ["a", "b", "c", "a", "a"]
+
+
+def test_rejects_when_the_wait_times_out():
+	controller = AdmissionController(max_concurrent=1, max_per_user=1, max_queue=10, max_wait_seconds=0.05)
+	controller.acquire("a")
+	started = time.monotonic()
+	with pytest.raises(AdmissionRejected) as excinfo:
+		controller.acquire("b")
+	assert time.monotonic() - started >= 0.05
+	assert excinfo.value.retry_after >= 1
+	stats = controller.stats()
+	assert stats["rejected_wait_timeout"] == 1
+	assert stats["queue_depth"] == 0
+	assert stats["users_waiting"] == 0
+
+	# The timed-out waiter must not be granted the slot once it frees up.
+	controller.release("a")
+	assert controller.stats()["running"] == 0
+
+
+def test_rejects_when_the_queue_is_full():
+	controller = AdmissionController(max_concurrent=1, max_per_user=1, max_queue=0, max_wait_seconds=5)
+	controller.acquire("a")
+	with pytest.raises(AdmissionRejected):
+		controller.acquire("b")
+	assert controller.stats()["rejected_queue_full"] == 1
+
+
+def test_admit_releases_the_slot_on_errors():
+	controller = AdmissionController(max_concurrent=1, max_per_user=1, max_queue=0, max_wait_seconds=1)
+	with pytest.raises(ValueError):
+		with controller.admit("a"):
+			raise ValueError()
+	with controller.admit("a"):
+		assert controller.stats()["running"] == 1
+	assert controller.stats()["running"] == 0
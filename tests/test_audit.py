@@ -0,0 +1,74 @@
+from types import SimpleNamespace
+
+import pytest
+
+import audit
+import helpers
+from fakes import FakeRequest, http_error, paged
+
+LIVE_VERSIONS = {
+	"1": {"containerVersionId": "3", "fingerprint": "f1",
+	      "tag": [{"name": "Paused", "tagId": "1", "paused": True, "firingTriggerId": ["7"]}],
+	      "trigger": [{"name": "Used", "triggerId": "7"}, {"name": "Grouped", "triggerId": "8"},
+	                  {"name": "Group", "triggerId": "9", "type": "triggerGroup", "parameter": [
+		                  {"key": "triggerIds", "type": "list", "list": [{"type": "triggerReference", "value": "8"}]}]},
+	                  {"name": "Unused", "triggerId": "10"}]},
+	"2": {"containerVersionId": "1", "fingerprint": "f2", "tag": [{"name": "Fine", "tagId": "2"}]},
+	"3": {"containerVersionId": "5", "fingerprint": "f3", "tag": [{"name": "Also paused", "tagId": "3", "paused": True}]},
+}
+CONTAINERS = [{"accountId": "100", "containerId": container_id, "name": f"Container {container_id}",
+               "path": f"accounts/100/containers/{container_id}"} for container_id in ["1", "2", "3", "4"]]
+
+
+def _live(parent, fields=None):
+	container_id = parent.rsplit("/", 1)[-1]
+	if container_id not in LIVE_VERSIONS:
+		return FakeRequest(http_error(404))
+	version = LIVE_VERSIONS[container_id]
+	if fields:
+		return FakeRequest({key: version[key] for key in ("containerVersionId", "fingerprint")})
+	return FakeRequest(version)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+	log = []
+	containers = SimpleNamespace(list=paged(CONTAINERS, "container", 2, log, "containers.list"),
+	                             versions=lambda: SimpleNamespace(live=_live))
+	client = SimpleNamespace(accounts=lambda: SimpleNamespace(containers=lambda: containers), log=log)
+	monkeypatch.setattr(helpers, "get_tag_manager_client", lambda credentials_dict: client)
+	cache_class = audit.AuditCache
+	monkeypatch.setattr(audit, "AuditCache", lambda: cache_class(str(tmp_path)))
+	return client
+
+
+def test_audits_containers_on_every_page(client):
+	report = audit.audit_account({}, "100", ["paused_tags"])
+	assert client.log == ["containers.list", "containers.list"]
+	assert report["containers_audited"] == 3
+	assert sorted(entry["container_id"] for entry in report["containers"]) == ["1", "3"]
+	assert report["findings_by_rule"] == {"paused_tags": 2}
+
+
+def test_unpublished_containers_are_skipped_not_failed(client):
+	report = audit.audit_account({}, "100", ["paused_tags"])
+	assert report["failed"] == []
+	assert report["no_live_version"] == [{"container_id": "4", "name": "Container 4"}]
+
+
+def test_triggers_in_trigger_groups_are_used(client):
+	report = audit.audit_account({}, "100", ["unused_triggers"])
+	(entry,) = report["containers"]
+	assert [finding["name"] for finding in entry["findings"]["unused_triggers"]] == ["Group", "Unused"]
+
+
+def test_reports_each_container_as_it_completes(client):
+	entries = []
+	report = audit.audit_account({}, "100", ["paused_tags"], on_container=entries.append)
+	assert sorted(entry["container_id"] for entry in entries) == ["1", "3"]
+	assert audit.audit_account({}, "100", ["paused_tags"])["containers_from_cache"] == 3
+
+
+def test_rejects_unknown_rules(client):
+	assert "error" in audit.audit_account({}, "100", ["nope"])
+	assert client.log == []
@@ -0,0 +1,91 @@
+import time
+import datetime
+import threading
+
+import pytest
+
+import jobs
+
+_waiting = threading.Event()
+_release = threading.Event()
+
+
+@jobs.job_operation("test_steps")
+def _steps_job(tag_manager_client, job, steps: int, wait: bool = False):
+	for step in range(steps):
+		job.check_cancelled()
+		if wait:
+			_waiting.set()
+			_release.wait(2)
+		job.add_result(step)
+		job.progress(step + 1, steps)
+
+
+def _wait_for(condition, timeout=2.0):
+	deadline = time.monotonic() + timeout
+	while not condition():
+		assert time.monotonic() < deadline, "condition not reached in time"
+		time.sleep(0.005)
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+	monkeypatch.setattr(jobs, "get_tag_manager_client", lambda credentials_dict: object())
+	_waiting.clear()
+	_release.clear()
+	manager = jobs.JobManager(jobs.JobStore(str(tmp_path)), max_workers=1)
+	yield manager
+	_release.set()
+	manager._executor.shutdown(wait=True)
+
+
+def test_job_runs_to_completion(manager):
+	record = manager.submit("test_steps", {"steps": 3}, {}, owner="a@example.com")
+	_wait_for(lambda: manager.get(record["id"], "a@example.com")["status"] == "succeeded")
+	finished = manager.get(record["id"], "a@example.com")
+	assert finished["results"] == [0, 1, 2]
+	assert finished["heartbeat_at"] is not None
+	assert manager.get(record["id"], "b@example.com") is None
+
+
+def test_cancel_stops_a_running_job_and_keeps_its_results(manager):
+	record = manager.submit("test_steps", {"steps": 50, "wait": True}, {}, owner="a")
+	# Cancel while the first step is in progress, after its cancellation check.
+	_wait_for(_waiting.is_set)
+	assert manager.cancel(record["id"], "a")["status"] == "cancelling"
+	_release.set()
+	_wait_for(lambda: manager.get(record["id"], "a")["status"] == "cancelled")
+	assert len(manager.get(record["id"], "a")["results"]) == 1
+
+
+def test_cancel_of_a_queued_job_is_applied_when_it_is_picked_up(manager):
+	running = manager.submit("test_steps", {"steps": 1, "wait": True}, {}, owner="a")
+	queued = manager.submit("test_steps", {"steps": 1}, {}, owner="a")
+	assert manager.cancel(queued["id"], "a")["status"] == "cancelling"
+	assert manager.get(queued["id"], "a")["status"] == "cancelling"
+	_release.set()
+	_wait_for(lambda: manager.get(queued["id"], "a")["status"] == "cancelled")
+	assert manager.get(queued["id"], "a")["results"] == []
+	_wait_for(lambda: manager.get(running["id"], "a")["status"] == "succeeded")
+
+
+def test_jobs_with_a_stale_heartbeat_are_reported_as_failed(manager):
+	stale = (datetime.datetime.now(datetime.timezone.utc)
+	         - datetime.timedelta(seconds=jobs.JOB_STALE_SECONDS + 1)).isoformat()
+	record = {"id": "lost", "operation": "test_steps", "params": {}, "owner": None, "status": "running",
+	          "progress": {}, "results": [], "error": None, "created_at": stale, "heartbeat_at": stale}
+	manager.store.save(record)
+	lost = manager.get("lost")
+	assert lost["status"] == "failed"
+	assert "instance" in lost["error"]
+	assert manager.cancel("lost")["status"] == "failed"
+
+
+def test_heartbeat_keeps_waiting_jobs_fresh(manager, monkeypatch):
+	monkeypatch.setattr(jobs, "JOB_HEARTBEAT_SECONDS", 0.02)
+	monkeypatch.setattr(jobs, "JOB_STALE_SECONDS", 0.1)
+	running = manager.submit("test_steps", {"steps": 1, "wait": True}, {}, owner="a")
+	queued = manager.submit("test_steps", {"steps": 1}, {}, owner="a")
+	time.sleep(0.3)
+	assert manager.get(running["id"], "a")["status"] == "running"
+	assert manager.get(queued["id"], "a")["status"] == "queued"
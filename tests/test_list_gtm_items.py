@@ -0,0 +1,99 @@
+from types import SimpleNamespace
+
+import pytest
+
+from tools import list_gtm_items
+from fakes import FakeRequest, paged
+
+TAGS = [
+	{"tagId": "1", "name": "GA4 - Page view", "type": "gaawe", "parentFolderId": "10", "firingTriggerId": ["100"]},
+	{"tagId": "2", "name": "GA4 - Purchase", "type": "gaawe", "parentFolderId": "10", "firingTriggerId": ["200"],
+	 "paused": True},
+	{"tagId": "3", "name": "Custom HTML", "type": "html", "firingTriggerId": ["100"]},
+	{"tagId": "4", "name": "GA4 - Sign up", "type": "gaawe", "parentFolderId": "20", "firingTriggerId": ["100"]},
+	{"tagId": "5", "name": "Ads conversion", "type": "awct", "parentFolderId": "10", "firingTriggerId": ["200"]},
+]
+ARGS = {"account_id": "1", "container_id": "2", "workspace_id": "3", "information_type": "tags"}
+
+
+@pytest.fixture
+def client():
+	log = []
+	empty = SimpleNamespace(list=lambda **kwargs: FakeRequest({}))
+	workspaces = SimpleNamespace(tags=lambda: SimpleNamespace(list=paged(TAGS, "tag", 2, log, "tags.list")),
+	                             variables=lambda: empty, built_in_variables=lambda: empty, triggers=lambda: empty,
+	                             folders=lambda: empty)
+	containers = SimpleNamespace(workspaces=lambda: workspaces, version_headers=lambda: empty)
+	return SimpleNamespace(accounts=lambda: SimpleNamespace(containers=lambda: containers), log=log)
+
+
+def _ids(result):
+	items = result["items"] if isinstance(result, dict) else result
+	return [item["id"] for item in items]
+
+
+def test_without_limit_or_offset_returns_a_plain_list(client):
+	result = list_gtm_items(client, **ARGS)
+	assert _ids(result) == ["1", "2", "3", "4", "5"]
+	assert result[0] == {"name": "GA4 - Page view", "id": "1", "type": "gaawe"}
+
+
+@pytest.mark.parametrize("filters, expected_ids", [
+	({"name_contains": "ga4"}, ["1", "2", "4"]),
+	({"item_type": "gaawe", "folder_id": "10"}, ["1", "2"]),
+	({"name_contains": "GA4", "paused": False}, ["1", "4"]),
+	({"paused": True}, ["2"]),
+	({"firing_trigger_id": "100", "item_type": "gaawe"}, ["1", "4"]),
+	({"firing_trigger_id": "200", "folder_id": "10", "name_contains": "ads"}, ["5"]),
+])
+def test_filters_combine(client, filters, expected_ids):
+	assert _ids(list_gtm_items(client, **ARGS, **filters)) == expected_ids
+
+
+def test_no_matches_returns_an_empty_list(client):
+	assert list_gtm_items(client, **ARGS, name_contains="nothing") == []
+
+
+def test_fields_adds_raw_fields(client):
+	result = list_gtm_items(client, **ARGS, paused=True, fields=["paused", "parentFolderId"])
+	assert result == [{"name": "GA4 - Purchase", "id": "2", "type": "gaawe", "paused": True, "parentFolderId": "10"}]
+
+
+def test_next_offset_pages_across_api_page_boundaries(client):
+	first = list_gtm_items(client, **ARGS, limit=3)
+	assert _ids(first) == ["1", "2", "3"]
+	assert first["next_offset"] == 3
+	second = list_gtm_items(client, **ARGS, limit=3, offset=first["next_offset"])
+	assert _ids(second) == ["4", "5"]
+	assert second["next_offset"] is None
+
+
+def test_next_offset_counts_matching_items_only(client):
+	first = list_gtm_items(client, **ARGS, item_type="gaawe", limit=2)
+	assert (_ids(first), first["next_offset"]) == (["1", "2"], 2)
+	second = list_gtm_items(client, **ARGS, item_type="gaawe", limit=2, offset=2)
+	assert (_ids(second), second["next_offset"]) == (["4"], None)
+
+
+def test_stops_fetching_pages_once_the_page_is_full(client):
+	list_gtm_items(client, **ARGS, limit=1)
+	# The first API page holds the first item and the one that shows there are more.
+	assert client.log == ["tags.list"]
+	client.log.clear()
+	list_gtm_items(client, **ARGS, limit=2, offset=1)
+	assert client.log == ["tags.list", "tags.list"]
+	client.log.clear()
+	list_gtm_items(client, **ARGS)
+	assert client.log == ["tags.list"] * 3
+
+
+def test_filters_raw_items_without_calling_the_api(client):
+	result = list_gtm_items(client, **ARGS, items=TAGS[:2], name_contains="purchase")
+	assert _ids(result) == ["2"]
+	assert client.log == []
+
+
+@pytest.mark.parametrize("pagination", [{"limit": 0}, {"limit": -5}, {"offset": -1}])
+def test_rejects_invalid_limit_and_offset(client, pagination):
+	assert "error" in list_gtm_items(client, **ARGS, **pagination)
+	assert client.log == []
@@ -0,0 +1,105 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import routing
+from routing import ModelRouter
+
+FAST, CAPABLE = "fast-model", "capable-model"
+
+
+class StubClient:
+	"""Stands in for the OpenAI client; outcomes maps a model to a response or an exception."""
+
+	def __init__(self, outcomes: dict, delay_seconds: float = 0.0):
+		self.outcomes = outcomes
+		self.delay_seconds = delay_seconds
+		self.options = {}
+		self.calls = []
+		self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+	def with_options(self, **options):
+		self.options.update(options)
+		return self
+
+	def _create(self, model, timeout, **kwargs):
+		self.calls.append({"model": model, "timeout": timeout, **kwargs})
+		time.sleep(self.delay_seconds)
+		outcome = self.outcomes[model]
+		if isinstance(outcome, Exception):
+			raise outcome
+		return outcome
+
+
+def _response(prompt_tokens=10, completion_tokens=5):
+	return SimpleNamespace(usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens))
+
+
+@pytest.fixture
+def router():
+	return ModelRouter(tiers=[FAST, CAPABLE], fallback=CAPABLE)
+
+
+def test_planning_goes_to_the_fast_tier(router):
+	assert router.choose([{"role": "user", "content": "List my tags"}], elapsed_seconds=0)[0] == FAST
+
+
+def test_complex_tool_results_go_to_the_capable_tier(router):
+	messages = [{"role": "user", "content": "What changed?"},
+	            {"role": "tool", "name": "compare_gtm_versions", "content": "{}"}]
+	assert router.choose(messages, elapsed_seconds=0) == (CAPABLE, "complex tool result")
+
+
+def test_large_tool_results_go_to_the_capable_tier_within_the_latency_budget(router):
+	large = "x" * (routing.ROUTING_LARGE_TOOL_RESULT_TOKENS * 4 + 100)
+	messages = [{"role": "user", "content": "List my tags"},
+	            {"role": "tool", "name": "list_gtm_items", "content": large}]
+	assert router.choose(messages, elapsed_seconds=0, latency_budget_seconds=30)[0] == CAPABLE
+
+	router._record(CAPABLE, 20.0, usage=_response().usage)
+	model, reason = router.choose(messages, elapsed_seconds=15, latency_budget_seconds=30)
+	assert model == FAST
+	assert "over latency budget" in reason
+
+
+def test_complete_disables_sdk_retries_and_records_usage(router):
+	client = StubClient({FAST: _response(prompt_tokens=12, completion_tokens=3)})
+	response, model = router.complete(client, FAST, timeout=10, messages=[])
+	assert model == FAST
+	assert client.options == {"max_retries": 0}
+	stats = router.stats()[FAST]
+	assert (stats["calls"], stats["errors"], stats["prompt_tokens"], stats["completion_tokens"]) == (1, 0, 12, 3)
+
+
+def test_complete_leaves_time_for_the_fallback(router):
+	client = StubClient({FAST: TimeoutError("timed out"), CAPABLE: _response()}, delay_seconds=0.2)
+	response, model = router.complete(client, FAST, timeout=1, messages=[])
+	assert model == CAPABLE
+	first, second = client.calls
+	assert first["model"] == FAST
+	assert first["timeout"] == pytest.approx(routing.ROUTING_FIRST_ATTEMPT_SHARE, abs=0.05)
+	# The fallback gets whatever the first attempt left of the deadline.
+	assert second["model"] == CAPABLE
+	assert second["timeout"] == pytest.approx(0.8, abs=0.05)
+	assert router.stats()[FAST]["errors"] == 1
+
+
+def test_complete_falls_back_to_another_tier_when_the_fallback_was_chosen(router):
+	client = StubClient({CAPABLE: RuntimeError("overloaded"), FAST: _response()})
+	response, model = router.complete(client, CAPABLE, timeout=10, messages=[])
+	assert model == FAST
+	assert [call["model"] for call in client.calls] == [CAPABLE, FAST]
+
+
+def test_complete_raises_when_every_attempt_fails(router):
+	client = StubClient({FAST: RuntimeError("first"), CAPABLE: RuntimeError("second")})
+	with pytest.raises(RuntimeError, match="second"):
+		router.complete(client, FAST, timeout=10, messages=[])
+
+
+def test_complete_does_not_fall_back_past_the_deadline(router):
+	client = StubClient({FAST: TimeoutError("timed out"), CAPABLE: _response()}, delay_seconds=0.06)
+	with pytest.raises(TimeoutError):
+		router.complete(client, FAST, timeout=0.05, messages=[])
+	assert [call["model"] for call in client.calls] == [FAST]
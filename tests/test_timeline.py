@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+import pytest
+
+import timeline
+from fakes import FakeRequest, paged
+
+VERSIONS = {
+	"1": {"containerVersionId": "1", "name": "v1", "description": "Added tag A", "fingerprint": "1700000000000",
+	      "tag": [{"name": "A", "tagId": "10", "type": "html"}]},
+	"2": {"containerVersionId": "2", "name": "v2", "description": "Changed tag A", "fingerprint": "1700000100000",
+	      "tag": [{"name": "A", "tagId": "10", "type": "gaawe"}]},
+}
+
+
+def _client(versions: dict, log: list):
+	headers = [{"containerVersionId": version_id} for version_id in versions]
+	containers = SimpleNamespace(
+		version_headers=lambda: SimpleNamespace(list=paged(headers, "containerVersionHeader", 10)),
+		versions=lambda: SimpleNamespace(
+			get=lambda path, containerVersionId: FakeRequest(versions[containerVersionId], log, containerVersionId)))
+	return SimpleNamespace(accounts=lambda: SimpleNamespace(containers=lambda: containers))
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+	store = timeline.TimelineStore(str(tmp_path))
+	monkeypatch.setattr(timeline, "get_timeline_store", lambda: store)
+	return store
+
+
+def test_entity_history_keeps_the_version_fields(store):
+	history = timeline.get_gtm_entity_history(_client(VERSIONS, []), "1", "2", entity_type="tag", entity_name="a")
+	assert [(entry["version_id"], entry["name"], entry["change"]) for entry in history] == [
+		("1", "v1", "added"), ("2", "v2", "modified")]
+	assert history[0]["description"] == "Added tag A"
+	assert history[0]["entity"] == {"name": "A", "id": "10"}
+	assert history[1]["entity"]["name"] == "A"
+
+
+def test_entity_history_filters_by_id(store):
+	history = timeline.get_gtm_entity_history(_client(VERSIONS, []), "1", "2", entity_id="10")
+	assert [entry["version_id"] for entry in history] == ["1", "2"]
+	assert timeline.get_gtm_entity_history(_client(VERSIONS, []), "1", "2", entity_id="99") == []
+
+
+def test_summary_without_an_entity_filter(store):
+	history = timeline.get_gtm_entity_history(_client(VERSIONS, []), "1", "2")
+	assert [entry["changes"] for entry in history] == [{"tag": {"added": 1}}, {"tag": {"modified": 1}}]
+
+
+def test_update_only_downloads_new_versions(store):
+	log = []
+	timeline.update_timeline(_client({"1": VERSIONS["1"]}, log), "1", "2", store)
+	assert log == ["1"]
+	log.clear()
+	updated = timeline.update_timeline(_client(VERSIONS, log), "1", "2", store)
+	# The last indexed version is downloaded again as the base of the new diff.
+	assert log == ["1", "2"]
+	assert [entry["version_id"] for entry in updated["entries"]] == ["1", "2"]
+	log.clear()
+	timeline.update_timeline(_client(VERSIONS, log), "1", "2", store)
+	assert log == []
+
+
+def test_rejects_unknown_entity_types(store):
+	assert "error" in timeline.get_gtm_entity_history(_client(VERSIONS, []), "1", "2", entity_type="folder")
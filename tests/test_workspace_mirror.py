@@ -0,0 +1,127 @@
+from types import SimpleNamespace
+
+import pytest
+
+import workspace_mirror
+from fakes import FakeRequest, http_error, paged
+
+ARGS = {"account_id": "1", "container_id": "2", "workspace_id": "3"}
+
+
+class FakeWorkspace:
+	"""A workspace whose status is derived from the difference between its base and its current tags."""
+
+	def __init__(self, tags: dict):
+		self.version_id = "1"
+		self.base = dict(tags)
+		self.tags = dict(tags)
+		self.log = []
+
+	def edit(self, tag_id: str, name: str):
+		self.tags[tag_id] = {"tagId": tag_id, "name": name, "fingerprint": f"{tag_id}-{name}"}
+
+	def _status(self):
+		changes = []
+		for tag_id in self.base.keys() | self.tags.keys():
+			if tag_id not in self.tags:
+				changes.append({"changeStatus": "deleted", "tag": self.base[tag_id]})
+			elif tag_id not in self.base:
+				changes.append({"changeStatus": "added", "tag": self.tags[tag_id]})
+			elif self.tags[tag_id] != self.base[tag_id]:
+				changes.append({"changeStatus": "updated", "tag": self.tags[tag_id]})
+		return {"workspaceChange": changes}
+
+	def _get(self, path):
+		tag_id = path.rsplit("/", 1)[-1]
+		return FakeRequest(self.tags[tag_id] if tag_id in self.tags else http_error(404), self.log, "tags.get")
+
+	def client(self):
+		tags = SimpleNamespace(list=lambda **kwargs: paged(list(self.tags.values()), "tag", 2, self.log,
+		                                                   "tags.list")(**kwargs),
+		                       get=self._get)
+		# Only tags are used; the other types exist because the mirror and list_gtm_items look up
+		# the methods of every type.
+		empty = SimpleNamespace(list=lambda **kwargs: FakeRequest({}), get=lambda path: FakeRequest(http_error(404)))
+		workspaces = SimpleNamespace(
+			tags=lambda: tags, variables=lambda: empty, triggers=lambda: empty, folders=lambda: empty,
+			built_in_variables=lambda: empty,
+			getStatus=lambda path: FakeRequest(self._status(), self.log, "status"))
+		containers = SimpleNamespace(
+			workspaces=lambda: workspaces,
+			version_headers=lambda: SimpleNamespace(
+				list=empty.list,
+				latest=lambda parent: FakeRequest({"containerVersionId": self.version_id}, self.log, "latest")))
+		return SimpleNamespace(accounts=lambda: SimpleNamespace(containers=lambda: containers))
+
+
+def _tag(tag_id: str, name: str):
+	return {"tagId": tag_id, "name": name, "fingerprint": f"{tag_id}-{name}"}
+
+
+@pytest.fixture
+def workspace(monkeypatch):
+	monkeypatch.setattr(workspace_mirror, "MIRROR_MIN_REFRESH_SECONDS", 0)
+	return FakeWorkspace({tag_id: _tag(tag_id, name) for tag_id, name in [("1", "A"), ("2", "B"), ("3", "C")]})
+
+
+@pytest.fixture
+def registry(workspace):
+	registry = workspace_mirror.WorkspaceMirrorRegistry()
+	registry.serve(workspace.client(), "u", "list_gtm_items", {**ARGS, "information_type": "tags"})
+	assert workspace.log == ["latest", "tags.list", "tags.list", "status"]
+	workspace.log.clear()
+	return registry
+
+
+def _names(registry, workspace):
+	items = registry.serve(workspace.client(), "u", "list_gtm_items", {**ARGS, "information_type": "tags"})
+	return sorted(item["name"] for item in items)
+
+
+def test_calls_for_unloaded_types_go_to_the_api(workspace):
+	registry = workspace_mirror.WorkspaceMirrorRegistry()
+	client = workspace.client()
+	assert registry.serve(client, "u", "list_gtm_items", {**ARGS, "information_type": "tags", "limit": 1}) is None
+	assert registry.serve(client, "u", "get_gtm_item", {**ARGS, "information_type": "tags", "item_id": "1"}) is None
+	assert workspace.log == []
+	assert registry.stats()["bypassed"] == 2
+	assert registry.stats()["workspaces"] == 0
+
+
+def test_updated_entities_are_applied_from_the_status(registry, workspace):
+	workspace.edit("1", "A2")
+	assert _names(registry, workspace) == ["A2", "B", "C"]
+	assert workspace.log == ["latest", "status"]
+
+
+def test_added_and_deleted_entities_are_applied_from_the_status(registry, workspace):
+	workspace.tags["4"] = _tag("4", "D")
+	del workspace.tags["2"]
+	assert _names(registry, workspace) == ["A", "C", "D"]
+	assert workspace.log == ["latest", "status"]
+
+
+def test_reverted_entities_are_fetched_again(registry, workspace):
+	workspace.edit("1", "A2")
+	_names(registry, workspace)
+	workspace.log.clear()
+	workspace.tags["1"] = workspace.base["1"]
+	assert _names(registry, workspace) == ["A", "B", "C"]
+	assert workspace.log == ["latest", "status", "tags.get"]
+
+
+def test_get_is_served_from_the_mirror_once_loaded(registry, workspace):
+	workspace.edit("2", "B2")
+	item = registry.serve(workspace.client(), "u", "get_gtm_item", {**ARGS, "information_type": "tags", "item_id": "2"})
+	assert item["name"] == "B2"
+	missing = registry.serve(workspace.client(), "u", "get_gtm_item",
+	                         {**ARGS, "information_type": "tags", "item_id": "9"})
+	assert "message" in missing
+
+
+def test_a_new_container_version_reloads_the_loaded_types(registry, workspace):
+	workspace.edit("1", "A2")
+	workspace.base = dict(workspace.tags)
+	workspace.version_id = "2"
+	assert _names(registry, workspace) == ["A2", "B", "C"]
+	assert workspace.log == ["latest", "tags.list", "tags.list", "status"]
@@ -0,0 +1,156 @@
+# timeline.py
+
+import os
+import logging
+import tempfile
+import threading
+from googleapiclient.errors import HttpError
+
+from tools import diff_gtm_versions, fingerprint_to_date, _iter_gtm_items, _handle_api_error, _handle_unexpected_error
+from helpers import lazy_singleton, JsonFileStore
+
+logger = logging.getLogger(__name__)
+
+TIMELINE_DIR = os.environ.get("TIMELINE_DIR", os.path.join(tempfile.gettempdir(), "gtm_agent_timelines"))
+
+ENTITY_TYPES = ["tag", "trigger", "variable"]
+
+
+class TimelineStore:
+	"""
+	Persists one version-history timeline per container as a JSON file.
+
+	A timeline holds the diff of every consecutive pair of (non-deleted)
+	container versions, plus the ID of the last version that was indexed.
+	"""
+
+	def __init__(self, directory: str = TIMELINE_DIR):
+		self._files = JsonFileStore(directory)
+		self._locks = {}
+		self._locks_lock = threading.Lock()
+
+	def lock(self, account_id: str, container_id: str):
+		"""Returns the lock that serializes indexing of a single container."""
+		with self._locks_lock:
+			return self._locks.setdefault((account_id, container_id), threading.Lock())
+
+	def load(self, account_id: str, container_id: str):
+		return self._files.load(f"{account_id}_{container_id}", default={
+			"account_id": account_id, "container_id": container_id, "last_version_id": None, "entries": []})
+
+	def save(self, timeline: dict):
+		self._files.save(f"{timeline['account_id']}_{timeline['container_id']}", timeline)
+
+
+get_timeline_store = lazy_singleton(TimelineStore)
+
+
+def _list_version_ids(tag_manager_client, account_id: str, container_id: str):
+	"""Returns the IDs of all non-deleted container versions, oldest first."""
+	parent_path = f"accounts/{account_id}/containers/{container_id}"
+	method = tag_manager_client.accounts().containers().version_headers().list
+	version_ids = [header['containerVersionId'] for header in _iter_gtm_items(method, parent_path, 'containerVersionHeader')
+	               if not header.get('deleted')]
+	return sorted(version_ids, key=int)
+
+
+def update_timeline(tag_manager_client, account_id: str, container_id: str, store: TimelineStore = None):
+	"""
+	Brings a container's timeline up to date by diffing only the versions
+	created since the last indexed one. Each version is downloaded at most
+	once per update, and the timeline is saved after every new entry so an
+	interrupted update resumes where it stopped.
+
+	Returns:
+		dict: The up-to-date timeline.
+	"""
+	store = store or get_timeline_store()
+	with store.lock(account_id, container_id):
+		timeline = store.load(account_id, container_id)
+		last_version_id = timeline["last_version_id"]
+		new_version_ids = [v for v in _list_version_ids(tag_manager_client, account_id, container_id)
+		                   if last_version_id is None or int(v) > int(last_version_id)]
+		if not new_version_ids:
+			return timeline
+
+		def get_version(version_id):
+			path = f"accounts/{account_id}/containers/{container_id}/versions/{version_id}"
+			return tag_manager_client.accounts().containers().versions().get(
+				path=path, containerVersionId=version_id).execute()
+
+		logger.info(f"--> [Timeline] Indexing {len(new_version_ids)} new versions for container {container_id}.")
+		previous = get_version(last_version_id) if last_version_id is not None else {}
+		for version_id in new_version_ids:
+			current = get_version(version_id)
+			diff = diff_gtm_versions(previous, current)
+			timeline["entries"].append({
+				"version_id": version_id,
+				"previous_version_id": previous.get("containerVersionId"),
+				"name": current.get("name"),
+				"description": current.get("description"),
+				"timestamp": fingerprint_to_date(current.get("fingerprint")),
+				"changes": {key: diff[key] for key in ENTITY_TYPES if key in diff},
+			})
+			timeline["last_version_id"] = version_id
+			store.save(timeline)
+			previous = current
+		return timeline
+
+
+def _matches(item: dict, entity_name: str, entity_id: str):
+	if entity_id is not None and entity_id not in (item.get("id"), item.get("old_id"), item.get("new_id")):
+		return False
+	if entity_name is not None and entity_name.lower() not in item.get("name", "").lower():
+		return False
+	return True
+
+
+def get_gtm_entity_history(tag_manager_client, account_id: str, container_id: str, entity_type: str = None,
+                           entity_name: str = None, entity_id: str = None):
+	"""
+	Returns every version in which a tag, trigger or variable was added,
+	deleted or modified, across the whole version history of a container.
+
+	Args:
+		tag_manager_client: An authorized Google Tag Manager API client object.
+		account_id (str): The GTM account ID.
+		container_id (str): The GTM container ID.
+		entity_type (str): Optional. One of "tag", "trigger", "variable".
+		entity_name (str): Optional. Case-insensitive substring of the entity name.
+		entity_id (str): Optional. The exact entity ID.
+
+	Returns:
+		list: One dictionary per matching change, oldest first, with the version
+			  ID, name, description and timestamp, the change and the changed entity
+			  under "entity". When no entity filter is given, a per-version summary
+			  of the number of changes is returned instead.
+			  Returns a dictionary with an "error" key if an error occurs.
+	"""
+	try:
+		if entity_type is not None and entity_type not in ENTITY_TYPES:
+			return {"error": f"Invalid entity_type: {entity_type}. Accepted types are: {', '.join(ENTITY_TYPES)}"}
+		timeline = update_timeline(tag_manager_client, account_id, container_id)
+		entity_types = [entity_type] if entity_type else ENTITY_TYPES
+
+		history = []
+		for entry in timeline["entries"]:
+			version_info = {key: entry[key] for key in ("version_id", "name", "description", "timestamp")
+			                if entry.get(key)}
+			if entity_name is None and entity_id is None:
+				history.append({**version_info, "changes": {
+					key: {change: len(items) for change, items in entry["changes"][key].items()}
+					for key in entity_types if key in entry["changes"]}})
+				continue
+			for key in entity_types:
+				for change, items in entry["changes"].get(key, {}).items():
+					for item in items:
+						if _matches(item, entity_name, entity_id):
+							history.append({**version_info, "entity_type": key, "change": change, "entity": item})
+
+		print(f"--> [GTM] Found {len(history)} timeline entries for container {container_id}.")
+		return history
+
+	except HttpError as e:
+		return _handle_api_error(e, "building GTM version timeline")
+	except Exception as e:
+		return _handle_unexpected_error(e, "building GTM version timeline")
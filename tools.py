@@ -6,13 +6,6 @@ from googleapiclient.errors import HttpError
 # from googleapiclient.discovery import build # Assuming 'build' might be needed if tag_manager_client isn't pre-built
 # from your_credential_module import load_credentials # Assuming 'load_credentials' exists
 
-logging.basicConfig(
-	level=logging.INFO,
-	format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-	handlers=[
-		logging.StreamHandler()
-	]
-)
 logger = logging.getLogger(__name__)
 
 
@@ -67,8 +60,41 @@ def _handle_unexpected_error(e: Exception, operation_name: str):
 	return {"error": f"An unexpected error occurred during {operation_name}: {str(e)}"}
 
 
+def _iter_gtm_items(method, parent_path: str, key: str):
+	"""
+	Yields the items of a paginated GTM list call one at a time. Pages are only
+	requested when the caller asks for more items, so stopping early saves calls.
+	"""
+	next_page_token = None
+	while True:
+		response = method(parent=parent_path, pageToken=next_page_token).execute()
+		yield from response.get(key, [])
+
+		next_page_token = response.get("nextPageToken")
+		if not next_page_token:
+			return  # No more pages
+
+
+def _matches_filters(item: dict, name_contains: str = None, item_type: str = None, folder_id: str = None,
+                     paused: bool = None, firing_trigger_id: str = None):
+	"""Returns True if a raw GTM item passes every filter that is set."""
+	if name_contains is not None and name_contains.lower() not in item.get('name', '').lower():
+		return False
+	if item_type is not None and item.get('type') != item_type:
+		return False
+	if folder_id is not None and item.get('parentFolderId') != folder_id:
+		return False
+	if paused is not None and bool(item.get('paused', False)) != paused:
+		return False
+	if firing_trigger_id is not None and firing_trigger_id not in item.get('firingTriggerId', []):
+		return False
+	return True
+
+
 def list_gtm_items(tag_manager_client, account_id: str, container_id: str, workspace_id: str = None,
-                   information_type: str = None):
+                   information_type: str = None, name_contains: str = None, item_type: str = None,
+                   folder_id: str = None, paused: bool = None, firing_trigger_id: str = None,
+                   fields: list = None, limit: int = None, offset: int = None, items: list = None):
 	"""
 	Retrieves a list of tags, variables, triggers, folders, built-in variables,
 	or container versions from a specified GTM workspace or container,
@@ -82,11 +108,22 @@ def list_gtm_items(tag_manager_client, account_id: str, container_id: str, works
 		information_type (str): The type of GTM item to list.
 								 Accepts: "tags", "variables", "built_in_variables",
 										  "triggers", "folders", "versions".
+		name_contains (str): Optional. Only items whose name contains this text (case-insensitive).
+		item_type (str): Optional. Only items of this GTM type, e.g. "gaawe" or "html".
+		folder_id (str): Optional. Only items in this folder.
+		paused (bool): Optional. Only paused (True) or active (False) tags.
+		firing_trigger_id (str): Optional. Only tags fired by this trigger.
+		fields (list): Optional. Extra raw API fields to return per item, e.g. ["paused", "parentFolderId"].
+		limit (int): Optional. The maximum number of items to return.
+		offset (int): Optional. The number of matching items to skip.
+		items (list): Optional. Raw items to filter instead of calling the API, e.g. from a workspace mirror.
 
 	Returns:
 		list: A list of dictionaries, where each dictionary represents an item of the
-			  specified `information_type`. Returns a dictionary with an "error" or
-			  "message" key if no items are found or an error occurs.
+			  specified `information_type`. When limit or offset is given, a dictionary
+			  with the "items" and the "next_offset" to continue from (None when there
+			  are no more items) is returned instead. Returns a dictionary with an
+			  "error" or "message" key if no items are found or an error occurs.
 	"""
 	# Define API methods for each information type
 	method_tags = tag_manager_client.accounts().containers().workspaces().tags().list
@@ -110,7 +147,7 @@ def list_gtm_items(tag_manager_client, account_id: str, container_id: str, works
 	try:
 		if information_type not in info_map:
 			return {"error": f"Invalid information_type: {information_type}. "
-			                 "Accepted types are: {', '.join(info_map.keys())}"}
+			                 f"Accepted types are: {', '.join(info_map.keys())}"}
 
 		if information_type == 'versions':
 			parent_path = f"accounts/{account_id}/containers/{container_id}"
@@ -120,22 +157,30 @@ def list_gtm_items(tag_manager_client, account_id: str, container_id: str, works
 				return {"error": "workspace_id is required for information_type other than 'versions'."}
 			parent_path = f"accounts/{account_id}/containers/{container_id}/workspaces/{workspace_id}"
 
-		config = info_map[information_type]
-
-		all_items = []
-		next_page_token = None
-		# Loop to handle pagination and retrieve all items
-		while True:
-			response = config['method'](parent=parent_path, pageToken=next_page_token).execute()
-			current_items = response.get(config['key'], [])
-			all_items.extend(current_items)
+		if limit is not None and limit < 1:
+			return {"error": f"Invalid limit: {limit}. limit must be at least 1."}
+		if offset is not None and offset < 0:
+			return {"error": f"Invalid offset: {offset}. offset must not be negative."}
 
-			next_page_token = response.get("nextPageToken")
-			if not next_page_token:
-				break  # No more pages
+		config = info_map[information_type]
+		paginate = limit is not None or offset is not None
+		offset = offset or 0
 
 		processed_items = []
-		for item in all_items:
+		has_more = False
+		matched = 0
+		# Stream items page by page and stop as soon as the requested page is full
+		source_items = items if items is not None else _iter_gtm_items(config['method'], parent_path, config['key'])
+		for item in source_items:
+			if not _matches_filters(item, name_contains, item_type, folder_id, paused, firing_trigger_id):
+				continue
+			matched += 1
+			if matched <= offset:
+				continue
+			if limit is not None and len(processed_items) == limit:
+				has_more = True
+				break
+
 			# Construct a dictionary with 'name', 'id', and 'type' (if available)
 			info = {
 				'name': item.get('name'),
@@ -143,11 +188,15 @@ def list_gtm_items(tag_manager_client, account_id: str, container_id: str, works
 			}
 			if 'type' in item:  # 'type' is not always present (e.g., for folders)
 				info['type'] = item['type']
+			for field in fields or []:
+				info[field] = item.get(field)
 			processed_items.append(info)
 
 		# Use the external helper function to remove keys with None values
 		processed_items = remove_null_keys(processed_items)
 		print(f"--> [GTM] Successfully listed {len(processed_items)} {information_type} items.")
+		if paginate:
+			return {"items": processed_items, "next_offset": offset + len(processed_items) if has_more else None}
 		return processed_items
 
 	except HttpError as e:
@@ -232,6 +281,89 @@ def get_gtm_item(tag_manager_client, account_id: str, container_id: str, workspa
 		return _handle_unexpected_error(e, f"retrieving GTM {information_type}")
 
 
+def _sort_obj(obj):
+	"""Recursively sorts dictionaries and lists for consistent comparison."""
+	if isinstance(obj, dict):
+		return {k: _sort_obj(v) for k, v in sorted(obj.items())}
+	if isinstance(obj, list):
+		# Sort list of dictionaries by their JSON representation to ensure consistent ordering
+		return sorted([_sort_obj(i) for i in obj], key=lambda x: json.dumps(x, sort_keys=True))
+	return obj
+
+
+def _serialize(obj):
+	"""Serializes an object to a consistent JSON string for comparison."""
+	return json.dumps(_sort_obj(obj), sort_keys=True)
+
+
+def _clean(item):
+	"""Removes GTM-specific metadata keys that should not be part of the comparison."""
+	# 'path' and 'fingerprint' are also dynamic and should be excluded for comparison
+	return {k: v for k, v in item.items() if k not in ['accountId', 'containerId', 'path', 'fingerprint']}
+
+
+def fingerprint_to_date(fp):
+	"""Converts GTM fingerprint (timestamp) to a readable date string."""
+	try:
+		return datetime.datetime.fromtimestamp(int(fp) / 1000).strftime("%Y-%m-%d %H:%M:%S")
+	except (ValueError, TypeError):
+		logger.warning(f"Invalid fingerprint value: {fp}. Returning N/A for timestamp.")
+		return "N/A"
+
+
+def diff_gtm_versions(version_old: dict, version_new: dict):
+	"""
+	Computes the differences between two already retrieved GTM container versions.
+
+	Args:
+		version_old (dict): The older container version, as returned by versions().get.
+		version_new (dict): The newer container version, as returned by versions().get.
+
+	Returns:
+		dict: The new version ID, its timestamp, and per entity type ("tag",
+			  "trigger", "variable") the added, deleted and modified items.
+			  Modified items include the top-level fields that changed.
+	"""
+	result = {
+		"version_new_id": version_new.get("containerVersionId"),
+		"timestamp_new": fingerprint_to_date(version_new.get("fingerprint"))
+	}
+
+	# Iterate through tags, triggers, and variables to find differences
+	for key in ["tag", "trigger", "variable"]:
+		id_key = f"{key}Id"
+		old_items = {i["name"]: i for i in version_old.get(key, [])}
+		new_items = {i["name"]: i for i in version_new.get(key, [])}
+
+		added = [{"name": i["name"], "id": i.get(id_key, "N/A")} for name, i in new_items.items() if
+		         name not in old_items]
+		deleted = [{"name": i["name"], "id": i.get(id_key, "N/A")} for name, i in old_items.items() if
+		           name not in new_items]
+
+		modified = []
+		for name in old_items.keys() & new_items.keys():
+			# Compare cleaned and serialized versions of the items
+			old_item, new_item = _clean(old_items[name]), _clean(new_items[name])
+			if _serialize(old_item) != _serialize(new_item):
+				modified.append({
+					"name": name,
+					"old_id": old_items[name].get(id_key, "N/A"),
+					"new_id": new_items[name].get(id_key, "N/A"),
+					"changed_fields": sorted(
+						field for field in old_item.keys() | new_item.keys()
+						if _serialize(old_item.get(field)) != _serialize(new_item.get(field)))
+				})
+
+		# Add the differences to the result only if there are any changes for the specific item type
+		if any([added, deleted, modified]):
+			result[key] = {}
+			if added: result[key]["added"] = added
+			if deleted: result[key]["deleted"] = deleted
+			if modified: result[key]["modified"] = modified
+
+	return result
+
+
 def compare_gtm_versions(tag_manager_client, account_id: str, container_id: str, version_id_old: str,
                          version_id_new: str):
 	"""
@@ -260,32 +392,6 @@ def compare_gtm_versions(tag_manager_client, account_id: str, container_id: str,
 		# Use the get method, similar to how it's used in get_gtm_item for versions
 		return gtm.accounts().containers().versions().get(path=path, containerVersionId=version_id).execute()
 
-	def sort_obj(obj):
-		"""Recursively sorts dictionaries and lists for consistent comparison."""
-		if isinstance(obj, dict):
-			return {k: sort_obj(v) for k, v in sorted(obj.items())}
-		if isinstance(obj, list):
-			# Sort list of dictionaries by their JSON representation to ensure consistent ordering
-			return sorted([sort_obj(i) for i in obj], key=lambda x: json.dumps(x, sort_keys=True))
-		return obj
-
-	def serialize(obj):
-		"""Serializes an object to a consistent JSON string for comparison."""
-		return json.dumps(sort_obj(obj), sort_keys=True)
-
-	def clean(item):
-		"""Removes GTM-specific metadata keys that should not be part of the comparison."""
-		# 'path' and 'fingerprint' are also dynamic and should be excluded for comparison
-		return {k: v for k, v in item.items() if k not in ['accountId', 'containerId', 'path', 'fingerprint']}
-
-	def fingerprint_to_date(fp):
-		"""Converts GTM fingerprint (timestamp) to a readable date string."""
-		try:
-			return datetime.datetime.fromtimestamp(int(fp) / 1000).strftime("%Y-%m-%d %H:%M:%S")
-		except (ValueError, TypeError):
-			logger.warning(f"Invalid fingerprint value: {fp}. Returning N/A for timestamp.")
-			return "N/A"
-
 	try:
 		logger.info(
 			f"--> [GTM] Comparing versions: old={version_id_old}, new={version_id_new} for container {container_id}")
@@ -300,38 +406,7 @@ def compare_gtm_versions(tag_manager_client, account_id: str, container_id: str,
 			return {
 				"error": f"Could not retrieve new version {version_id_new}. Details: {version_new.get('error', 'Unknown error')}"}
 
-		result = {
-			"version_new_id": version_new.get("containerVersionId"),
-			"timestamp_new": fingerprint_to_date(version_new.get("fingerprint"))
-		}
-
-		# Iterate through tags, triggers, and variables to find differences
-		for key in ["tag", "trigger", "variable"]:
-			id_key = f"{key}Id"
-			old_items = {i["name"]: i for i in version_old.get(key, [])}
-			new_items = {i["name"]: i for i in version_new.get(key, [])}
-
-			added = [{"name": i["name"], "id": i.get(id_key, "N/A")} for name, i in new_items.items() if
-			         name not in old_items]
-			deleted = [{"name": i["name"], "id": i.get(id_key, "N/A")} for name, i in old_items.items() if
-			           name not in new_items]
-
-			modified = []
-			for name in old_items.keys() & new_items.keys():
-				# Compare cleaned and serialized versions of the items
-				if serialize(clean(old_items[name])) != serialize(clean(new_items[name])):
-					modified.append({
-						"name": name,
-						"old_id": old_items[name].get(id_key, "N/A"),
-						"new_id": new_items[name].get(id_key, "N/A")
-					})
-
-			# Add the differences to the result only if there are any changes for the specific item type
-			if any([added, deleted, modified]):
-				result[key] = {}
-				if added: result[key]["added"] = added
-				if deleted: result[key]["deleted"] = deleted
-				if modified: result[key]["modified"] = modified
+		result = diff_gtm_versions(version_old, version_new)
 
 		logger.info(
 			f"--> [GTM] Successfully compared versions. Found differences: {bool(result.get('tag') or result.get('trigger') or result.get('variable'))}")
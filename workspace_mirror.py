@@ -0,0 +1,251 @@
+# workspace_mirror.py
+
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from googleapiclient.errors import HttpError
+
+from tools import _iter_gtm_items, list_gtm_items
+from helpers import lazy_singleton
+
+logger = logging.getLogger(__name__)
+
+WORKSPACE_MIRROR_ENABLED = os.environ.get("WORKSPACE_MIRROR_ENABLED", "true").lower() == "true"
+# Reads within this many seconds of the last refresh are served without any API call.
+MIRROR_MIN_REFRESH_SECONDS = float(os.environ.get("MIRROR_MIN_REFRESH_SECONDS", 5))
+# A full resync is forced after this long, as a safety net for changes the status cannot show.
+MIRROR_FULL_RESYNC_SECONDS = float(os.environ.get("MIRROR_FULL_RESYNC_SECONDS", 3600))
+MIRROR_MAX_WORKSPACES = int(os.environ.get("MIRROR_MAX_WORKSPACES", 20))
+
+# Mirrored information types, with their response / status key and item ID key.
+MIRRORED_TYPES = {
+	'tags': {'key': 'tag', 'item_id_key': 'tagId'},
+	'variables': {'key': 'variable', 'item_id_key': 'variableId'},
+	'triggers': {'key': 'trigger', 'item_id_key': 'triggerId'},
+	'folders': {'key': 'folder', 'item_id_key': 'folderId'},
+}
+
+
+class WorkspaceMirror:
+	"""
+	A local copy of the tags, variables, triggers and folders of one workspace.
+
+	Types are only loaded when first listed in full, so a mirror never lists
+	more than the calls it serves would have. A refresh costs two API calls
+	when the workspace is unchanged. workspaces.getStatus returns every entity
+	that differs from the workspace's base version, including its body, so
+	changed entities are applied straight from the status whenever their
+	fingerprint differs from the local copy. Entities that drop out of the
+	status were reverted and are fetched individually. A new container version
+	(which may become the workspace's new base) reloads every loaded type.
+	"""
+
+	def __init__(self, account_id: str, container_id: str, workspace_id: str):
+		self.container_path = f"accounts/{account_id}/containers/{container_id}"
+		self.workspace_path = f"{self.container_path}/workspaces/{workspace_id}"
+		self.entities = {information_type: {} for information_type in MIRRORED_TYPES}
+		self.lock = threading.Lock()
+		self._loaded = set()
+		self._changed = set()
+		self._latest_version_id = None
+		self._full_synced_at = None
+		self._refreshed_at = None
+		self.api_calls = 0
+
+	def _execute(self, request):
+		self.api_calls += 1
+		return request.execute()
+
+	def _counted(self, method):
+		"""Wraps a list method so the pages _iter_gtm_items requests count towards api_calls."""
+
+		def counted_method(**kwargs):
+			self.api_calls += 1
+			return method(**kwargs)
+
+		return counted_method
+
+	def is_loaded(self, information_type: str):
+		with self.lock:
+			return information_type in self._loaded
+
+	def refresh(self, tag_manager_client, load: str = None):
+		"""
+		Brings the loaded types up to date with as few API calls as possible,
+		first loading the type given by load if it is not mirrored yet.
+		"""
+		with self.lock:
+			now = time.monotonic()
+			if (load is None or load in self._loaded) and self._refreshed_at is not None \
+					and now - self._refreshed_at < MIRROR_MIN_REFRESH_SECONDS:
+				return
+			containers = tag_manager_client.accounts().containers()
+			latest = self._execute(containers.version_headers().latest(parent=self.container_path))
+			if (self._full_synced_at is None or now - self._full_synced_at > MIRROR_FULL_RESYNC_SECONDS
+					or latest.get('containerVersionId') != self._latest_version_id):
+				self._full_sync(tag_manager_client, self._loaded | ({load} if load else set()))
+				self._latest_version_id = latest.get('containerVersionId')
+			else:
+				self._incremental_sync(tag_manager_client)
+				if load and load not in self._loaded:
+					self._load(tag_manager_client, load)
+			self._refreshed_at = time.monotonic()
+
+	def _load(self, tag_manager_client, information_type: str):
+		workspaces = tag_manager_client.accounts().containers().workspaces()
+		methods = {'tags': workspaces.tags().list, 'variables': workspaces.variables().list,
+		           'triggers': workspaces.triggers().list, 'folders': workspaces.folders().list}
+		config = MIRRORED_TYPES[information_type]
+		items = {}
+		for item in _iter_gtm_items(self._counted(methods[information_type]), self.workspace_path, config['key']):
+			items[item[config['item_id_key']]] = item
+		self.entities[information_type] = items
+		self._loaded.add(information_type)
+
+	def _full_sync(self, tag_manager_client, information_types: set):
+		self._loaded = set()
+		self.entities = {information_type: {} for information_type in MIRRORED_TYPES}
+		for information_type in information_types:
+			self._load(tag_manager_client, information_type)
+		self._changed = set(self._status_changes(tag_manager_client))
+		self._full_synced_at = time.monotonic()
+		logger.info(f"--> [Mirror] Full sync of {self.workspace_path}: "
+		            f"{', '.join(f'{len(self.entities[t])} {t}' for t in sorted(self._loaded))}.")
+
+	def _status_changes(self, tag_manager_client):
+		"""Returns {(information_type, item_id): (change_status, entity)} from workspaces.getStatus."""
+		status = self._execute(
+			tag_manager_client.accounts().containers().workspaces().getStatus(path=self.workspace_path))
+		changes = {}
+		for change in status.get('workspaceChange', []):
+			for information_type, config in MIRRORED_TYPES.items():
+				entity = change.get(config['key'])
+				if entity:
+					changes[(information_type, entity[config['item_id_key']])] = (change.get('changeStatus'), entity)
+		return changes
+
+	def _incremental_sync(self, tag_manager_client):
+		changes = self._status_changes(tag_manager_client)
+		applied = 0
+		for (information_type, item_id), (change_status, entity) in changes.items():
+			if information_type not in self._loaded:
+				continue
+			items = self.entities[information_type]
+			if change_status == 'deleted':
+				applied += items.pop(item_id, None) is not None
+			elif items.get(item_id, {}).get('fingerprint') != entity.get('fingerprint'):
+				items[item_id] = entity
+				applied += 1
+
+		# Entities that no longer differ from the base version were reverted; fetch them again.
+		workspaces = tag_manager_client.accounts().containers().workspaces()
+		methods = {'tags': workspaces.tags().get, 'variables': workspaces.variables().get,
+		           'triggers': workspaces.triggers().get, 'folders': workspaces.folders().get}
+		for information_type, item_id in self._changed - changes.keys():
+			if information_type not in self._loaded:
+				continue
+			try:
+				self.entities[information_type][item_id] = self._execute(methods[information_type](
+					path=f"{self.workspace_path}/{information_type}/{item_id}"))
+			except HttpError as e:
+				if e.resp.status != 404:
+					raise
+				self.entities[information_type].pop(item_id, None)
+			applied += 1
+		self._changed = set(changes)
+		if applied:
+			logger.info(f"--> [Mirror] Applied {applied} changes to {self.workspace_path}.")
+
+	def items(self, information_type: str):
+		"""Returns the mirrored raw items of a type."""
+		with self.lock:
+			return list(self.entities[information_type].values())
+
+	def get(self, information_type: str, item_id: str):
+		"""Returns a mirrored raw item, or None if it does not exist."""
+		with self.lock:
+			return self.entities[information_type].get(str(item_id))
+
+	def upsert(self, information_type: str, item: dict):
+		"""Stores an item written through the API, e.g. a renamed tag, if its type is mirrored."""
+		with self.lock:
+			if information_type not in self._loaded:
+				return
+			self.entities[information_type][item[MIRRORED_TYPES[information_type]['item_id_key']]] = item
+
+
+class WorkspaceMirrorRegistry:
+	"""Keeps the most recently used mirrors, scoped per user."""
+
+	def __init__(self, max_workspaces: int = MIRROR_MAX_WORKSPACES):
+		self.max_workspaces = max_workspaces
+		self._mirrors = OrderedDict()
+		self._lock = threading.Lock()
+		self._stats = {"hits": 0, "fallbacks": 0, "bypassed": 0}
+
+	def get(self, owner: str, account_id: str, container_id: str, workspace_id: str, create: bool = True):
+		"""Returns the mirror of a workspace, or None if there is none and create is False."""
+		key = (owner, account_id, container_id, workspace_id)
+		with self._lock:
+			mirror = self._mirrors.pop(key, None)
+			if mirror is None:
+				if not create:
+					return None
+				mirror = WorkspaceMirror(account_id, container_id, workspace_id)
+			self._mirrors[key] = mirror
+			while len(self._mirrors) > self.max_workspaces:
+				self._mirrors.popitem(last=False)
+			return mirror
+
+	def _count(self, counter: str):
+		with self._lock:
+			self._stats[counter] += 1
+
+	def serve(self, tag_manager_client, owner: str, function_name: str, function_args: dict):
+		"""
+		Answers a list_gtm_items or get_gtm_item call from the workspace mirror.
+
+		A type is loaded into the mirror by the first list_gtm_items call without
+		limit or offset, which has to list every item anyway. Paged lists and
+		get_gtm_item calls for a type that is not loaded yet go to the API, so
+		they keep their early exit and single request.
+
+		Returns None when the call cannot be served from a mirror, in which case
+		the caller should call the tool as usual.
+		"""
+		information_type = function_args.get("information_type")
+		workspace_id = function_args.get("workspace_id")
+		if (function_name not in ("list_gtm_items", "get_gtm_item") or information_type not in MIRRORED_TYPES
+				or not workspace_id):
+			return None
+		loads = (function_name == "list_gtm_items" and function_args.get("limit") is None
+		         and function_args.get("offset") is None)
+		mirror = self.get(owner, function_args.get("account_id"), function_args.get("container_id"), workspace_id,
+		                  create=loads)
+		if mirror is None or (not loads and not mirror.is_loaded(information_type)):
+			self._count("bypassed")
+			return None
+		try:
+			mirror.refresh(tag_manager_client, load=information_type if loads else None)
+		except Exception as e:
+			logger.warning(f"--> [Mirror] Refresh of {mirror.workspace_path} failed, falling back to the API: {e}")
+			self._count("fallbacks")
+			return None
+		self._count("hits")
+		if function_name == "list_gtm_items":
+			return list_gtm_items(tag_manager_client, **function_args, items=mirror.items(information_type))
+		item = mirror.get(information_type, function_args.get("item_id"))
+		if item is None:
+			return {"message": f"No {information_type} found with ID: {function_args.get('item_id')}"}
+		return item
+
+	def stats(self):
+		"""Returns how many calls were served from mirrors and the API calls the mirrors made."""
+		with self._lock:
+			return {**self._stats, "workspaces": len(self._mirrors),
+			        "api_calls": sum(mirror.api_calls for mirror in self._mirrors.values())}
+
+
+get_mirror_registry = lazy_singleton(WorkspaceMirrorRegistry)